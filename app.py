@@ -1,68 +1,253 @@
 import os
-from flask import Flask, render_template, request
+import logging
+import multiprocessing
+from flask import (Flask, Response, abort, render_template, request, jsonify, send_file, send_from_directory,
+                   url_for)
 from dotenv import load_dotenv
 
 # Pipeline imports
-from pipeline.script_writer import write_script, generate_background_prompt
-from pipeline.image_generator import generate_images
-from pipeline.voiceover import generate_voiceover
-from pipeline.video_maker import create_video
+from pipeline.jobs import JobQueue, QueueFullError, DONE, FAILED
+from pipeline.cache import get_cache
+from pipeline.coalesce import coalesce_enabled, get_single_flight
+from pipeline.metrics import register_gauge, render_prometheus
+from pipeline.script_writer import MAX_SCRIPT_LINES
+from pipeline.warmup import prewarm_enabled, start_prewarm
 
 load_dotenv()
 
+# Pipeline spans are logged as key=value lines on the "reel.trace" logger
+logging.basicConfig(level=os.environ.get("REEL_LOG_LEVEL", "INFO").upper(),
+                    format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+logger = logging.getLogger(__name__)
+
 app = Flask(__name__)
 
+# Render workers are spawned, and each one re-imports the main script (this file when it
+# is run directly) as __mp_main__. Only the serving process gets a job queue and prewarms;
+# a worker that did would start a render pool of its own, whose workers would do the same.
+SERVER_PROCESS = multiprocessing.current_process().name == "MainProcess"
+
+# Bounded worker pool shared by every request handled by this process
+jobs = JobQueue() if SERVER_PROCESS else None
+if SERVER_PROCESS:
+    register_gauge("reel_jobs", "Jobs waiting for or holding a worker.",
+                   lambda: [({"state": state}, count) for state, count in jobs.counts().items()])
+
+# Heavy libraries load on first use. REEL_PREWARM=1 loads them, the API clients and
+# every render worker in the background instead, so the first reel does not wait.
+# (Under the debug reloader only the serving child warms up.)
+if (SERVER_PROCESS and prewarm_enabled()
+        and (__name__ != '__main__' or os.environ.get("WERKZEUG_RUN_MAIN") == "true")):
+    start_prewarm()
+
+
+def wants_json():
+    best = request.accept_mimetypes.best_match(['application/json', 'text/html'])
+    return request.is_json or best == 'application/json'
+
+
+def web_path(path):
+    # 'static/output/<job>/final_video.mp4' -> '/static/output/<job>/final_video.mp4'
+    return "/" + path.replace(os.sep, "/").lstrip("/")
+
+
+# Served with the right types for players; .ts is not in every mimetypes table
+MEDIA_TYPES = {".m3u8": "application/vnd.apple.mpegurl", ".ts": "video/mp2t", ".mp4": "video/mp4"}
+
+# Artifacts are named by their content hash, so they can be cached for good
+ARTIFACT_MAX_AGE = 365 * 24 * 3600
+
+
+def media_url(job, path):
+    filename = os.path.relpath(path, job.output_dir).replace(os.sep, "/")
+    return url_for('job_media', job_id=job.id, filename=filename)
+
+
+def artifact_url(job, kind, fallback):
+    """Immutable URL of a published artifact, or fallback when the job has none of that kind."""
+    name = job.artifacts.get(kind)
+    return url_for('artifact', name=name) if name else fallback
+
+
+def job_payload(job):
+    payload = job.to_dict()
+    payload["status_url"] = url_for('job_status', job_id=job.id)
+    payload["result_url"] = url_for('job_result', job_id=job.id)
+    if job.stream_path:
+        # HLS playlist that grows scene by scene while the job renders
+        payload["stream_url"] = media_url(job, job.stream_path)
+    if job.preview_path:
+        # Low-resolution preview, available while the final render is still running
+        payload["preview_url"] = artifact_url(job, "preview", media_url(job, job.preview_path))
+    if job.status == DONE:
+        payload["video_url"] = artifact_url(job, "video", media_url(job, job.result["video_path"]))
+        payload["ui_bg"] = artifact_url(job, "ui_bg", web_path(job.result["ui_bg_path"]))
+        payload["script_lines"] = job.result["script_lines"]
+        payload["critical_path"] = job.result.get("critical_path")
+        payload["reused_scenes"] = job.result.get("reused_scenes")
+        payload["edit_url"] = url_for('job_edit', job_id=job.id)
+    return payload
+
+
 @app.route('/', methods=['GET', 'POST'])
 def index():
     if request.method == 'POST':
-        prompt = request.form.get('prompt')
+        prompt = request.form.get('prompt') or (request.get_json(silent=True) or {}).get('prompt')
         if not prompt:
+            if wants_json():
+                return jsonify(error="Please enter a prompt."), 400
             return render_template('index.html', error="Please enter a prompt.")
-        
+
         try:
-            # 1. Script
-            print(f"Generating script for: {prompt}")
-            script_lines = write_script(prompt)
-            if not script_lines:
-                return render_template('index.html', error="Failed to generate script.")
-            
-            # 2. Images
-            print("Generating images...")
-            bg_prompt = generate_background_prompt(prompt)
-            print(f"Background Style: {bg_prompt}")
-            image_paths, ui_bg_path = generate_images(script_lines, bg_prompt)
-            
-            if not image_paths:
-                return render_template('index.html', error="Failed to generate images.")
-                
-            # 3. Voiceover
-            print("Generating voiceover...")
-            voiceover_path = generate_voiceover(script_lines)
-            if not voiceover_path:
-                return render_template('index.html', error="Failed to generate voiceover.")
-                
-            # 4. Video
-            print("Creating final video...")
-            video_path = create_video(image_paths, voiceover_path, script_lines)
-            if not video_path:
-                return render_template('index.html', error="Failed to create video.")
-                
-            # Make path relative for generic static serving
-            # video_path is absolute or relative like 'static/output/final_video.mp4'
-            # We want to pass just the web path.
-            web_path = "static/output/final_video.mp4" 
-            # Note: browsers might cache, so maybe add a query param?
-            import time
-            web_path += f"?t={int(time.time())}"
-            
-            return render_template('index.html', video_url=web_path, script_lines=script_lines, ui_bg=ui_bg_path)
-            
-        except Exception as e:
-            print(f"Error: {e}")
-            return render_template('index.html', error=str(e))
+            job = jobs.submit(prompt)
+        except QueueFullError as e:
+            if wants_json():
+                return jsonify(error=str(e)), 503
+            return render_template('index.html', error=str(e)), 503
+
+        logger.info(f"Queued job {job.id} for: {prompt}")
+        if wants_json():
+            return jsonify(job_payload(job)), 202
+        return render_template('index.html', job_id=job.id,
+                               status_url=url_for('job_status', job_id=job.id),
+                               result_url=url_for('job_result', job_id=job.id))
 
     return render_template('index.html')
 
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify(error="Unknown job."), 404
+    return jsonify(job_payload(job))
+
+
+@app.route('/jobs/<job_id>/result')
+def job_result(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return render_template('index.html', error="Unknown job."), 404
+
+    if job.status == FAILED:
+        return render_template('index.html', error=job.error)
+    if job.status != DONE:
+        # Still working: keep polling from the same page
+        return render_template('index.html', job_id=job.id,
+                               status_url=url_for('job_status', job_id=job.id),
+                               result_url=url_for('job_result', job_id=job.id))
+
+    return render_template('index.html',
+                           video_url=artifact_url(job, "video", media_url(job, job.result["video_path"])),
+                           # Resume where the preview was when the final replaced it
+                           start_at=request.args.get('t', type=float),
+                           script_lines=job.result["script_lines"],
+                           ui_bg=artifact_url(job, "ui_bg", web_path(job.result["ui_bg_path"])))
+
+
+@app.route('/jobs/<job_id>/edit', methods=['POST'])
+def job_edit(job_id):
+    """
+    Re-renders a finished reel with an edited script, as a new job.
+    Takes {"script_lines": [...]} or {"index": i, "text": "..."}. Scenes whose
+    inputs did not change are reused from this job; only the rest are regenerated.
+    """
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify(error="Unknown job."), 404
+    if job.status != DONE:
+        return jsonify(error="Only finished reels can be edited."), 409
+
+    data = request.get_json(silent=True) or {}
+    script_lines = list(job.result["script_lines"])
+    if "script_lines" in data:
+        script_lines = data["script_lines"]
+        if not isinstance(script_lines, list):
+            return jsonify(error="script_lines must be a list of strings."), 400
+        if len(script_lines) > MAX_SCRIPT_LINES:
+            return jsonify(error=f"A reel has at most {MAX_SCRIPT_LINES} script lines."), 400
+    elif "index" in data and "text" in data:
+        index = data["index"]
+        if isinstance(index, bool) or not isinstance(index, int) or not 0 <= index < len(script_lines):
+            return jsonify(error="index is out of range."), 400
+        if not isinstance(data["text"], str):
+            return jsonify(error="text must be a string."), 400
+        script_lines[index] = data["text"]
+    else:
+        return jsonify(error="Send script_lines, or index and text."), 400
+    if not script_lines or not all(isinstance(line, str) and line.strip() for line in script_lines):
+        return jsonify(error="Script lines must be non-empty strings."), 400
+
+    try:
+        edit = jobs.submit(job.prompt, script=([line.strip() for line in script_lines],
+                                               job.result["background_prompt"]), parent=job)
+    except QueueFullError as e:
+        return jsonify(error=str(e)), 503
+
+    logger.info(f"Queued edit {edit.id} of job {job.id}")
+    return jsonify(job_payload(edit)), 202
+
+
+@app.route('/jobs/<job_id>/media/<path:filename>')
+def job_media(job_id, filename):
+    """
+    Serves a job's videos and stream chunks with Range support, so players can
+    start (and seek) before a file has been downloaded in full.
+    """
+    job = jobs.get(job_id)
+    mimetype = MEDIA_TYPES.get(os.path.splitext(filename)[1])
+    if job is None or mimetype is None:
+        abort(404)
+    # The playlist changes while the job runs; chunks and finished videos never do
+    max_age = 0 if filename.endswith(".m3u8") else 3600
+    return send_from_directory(os.path.abspath(job.output_dir), filename, mimetype=mimetype,
+                               conditional=True, max_age=max_age)
+
+
+@app.route('/artifacts/<name>')
+def artifact(name):
+    """
+    Serves a published video, preview or background. The name is the file's
+    SHA-256, used as a strong ETag; browsers and proxies may keep the file
+    for a year without revalidating (Range and If-None-Match are honoured).
+    """
+    store = jobs.store
+    path = store.path(name) if store is not None else None
+    if path is None or not os.path.isfile(path):
+        abort(404)
+    store.touch(name)
+    response = send_file(os.path.abspath(path), mimetype=MEDIA_TYPES.get(os.path.splitext(name)[1]),
+                         conditional=True, etag=name.split(".")[0], max_age=ARTIFACT_MAX_AGE)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
+@app.route('/artifacts/stats')
+def artifact_stats():
+    if jobs.store is None:
+        return jsonify(enabled=False)
+    return jsonify(enabled=True, **jobs.store.stats())
+
+
+@app.route('/cache/stats')
+def cache_stats():
+    cache = get_cache()
+    if cache is None:
+        return jsonify(enabled=False)
+    return jsonify(enabled=True, **cache.stats())
+
+
+@app.route('/coalesce/stats')
+def coalesce_stats():
+    return jsonify(enabled=coalesce_enabled(), **get_single_flight().stats())
+
+
+@app.route('/metrics')
+def metrics():
+    return Response(render_prometheus(), mimetype="text/plain; version=0.0.4")
+
+
 if __name__ == '__main__':
-    print("Starting Flask server...")
+    logger.info("Starting Flask server...")
     app.run(debug=True, port=5001)
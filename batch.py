@@ -0,0 +1,238 @@
+"""
+Generates many reels from a list of topics.
+
+Topics come from a JSONL file (one {"topic": ...} object or a bare JSON string
+per line, with an optional "id") or a CSV file with a "topic" column (or the
+topics in its first column). Each reel is written to its own directory under
+--output-dir, and every finished topic is appended to manifest.jsonl there, so
+a batch that crashes or is interrupted picks up where it stopped when it is
+run again.
+
+    python batch.py topics.jsonl --output-dir batch_output --workers 4 --api-concurrency 4
+    python batch.py topics.csv --output-dir batch_output --retry-failed
+"""
+import argparse
+import csv
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+logger = logging.getLogger("reel.batch")
+
+MANIFEST_NAME = "manifest.jsonl"
+
+# Nobody watches a batch render, so skip the preview and the HLS stream, and
+# render inline in each worker rather than through a nested segment pool.
+# Anything already set in the environment wins.
+BATCH_ENV = {
+    "REEL_PREVIEW_PROFILE": "none",
+    "REEL_STREAM": "0",
+    "REEL_RENDER_MODE": "pipe",
+}
+
+
+def topic_key(topic):
+    return hashlib.sha1(topic.encode("utf-8")).hexdigest()[:12]
+
+
+def read_topics(path):
+    """Returns [(key, topic)] from a .jsonl or .csv file, skipping blanks and duplicates."""
+    rows = []
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.lower().endswith(".csv"):
+            reader = csv.reader(f)
+            header = next(reader, [])
+            names = [name.strip().lower() for name in header]
+            if "topic" in names or "prompt" in names:
+                col = names.index("topic") if "topic" in names else names.index("prompt")
+                id_col = names.index("id") if "id" in names else None
+            else:
+                # No header: the first row is already a topic
+                col, id_col = 0, None
+                rows.append((None, header[0] if header else ""))
+            for row in reader:
+                if len(row) > col:
+                    rows.append((row[id_col] if id_col is not None and len(row) > id_col else None, row[col]))
+        else:
+            for number, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                item = json.loads(line)
+                if isinstance(item, str):
+                    rows.append((None, item))
+                elif isinstance(item, dict) and (item.get("topic") or item.get("prompt")):
+                    rows.append((item.get("id"), item.get("topic") or item.get("prompt")))
+                else:
+                    raise ValueError(f"{path}:{number}: expected a string or an object with a \"topic\"")
+
+    topics = []
+    seen = set()
+    for key, topic in rows:
+        topic = topic.strip()
+        if not topic:
+            continue
+        key = str(key) if key else topic_key(topic)
+        if key not in seen:
+            seen.add(key)
+            topics.append((key, topic))
+    return topics
+
+
+def topic_dir(output_dir, key, topic):
+    slug = re.sub(r"[^a-z0-9]+", "-", topic.lower()).strip("-")[:40] or "reel"
+    return os.path.join(output_dir, f"{slug}-{key}")
+
+
+def load_manifest(path):
+    """Latest record per topic key. A line cut short by a crash is ignored."""
+    records = {}
+    if not os.path.exists(path):
+        return records
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            records[record["key"]] = record
+    return records
+
+
+def append_manifest(f, record):
+    f.write(json.dumps(record) + "\n")
+    f.flush()
+    os.fsync(f.fileno())
+
+
+def init_worker(api_slots):
+    from pipeline.limits import set_api_slots
+
+    logging.basicConfig(level=os.environ.get("REEL_LOG_LEVEL", "WARNING").upper(),
+                        format="%(asctime)s %(processName)s %(name)s %(levelname)s %(message)s")
+    set_api_slots(api_slots)
+
+
+def run_topic(key, topic, output_dir):
+    """Runs one reel in a worker process; returns its manifest record instead of raising."""
+    from pipeline.jobs import PipelineError, run_reel
+
+    start = time.perf_counter()
+    record = {"key": key, "topic": topic, "output_dir": output_dir}
+    try:
+        result = run_reel(topic, output_dir)
+        record.update(status="done", video_path=result["video_path"])
+    except PipelineError as e:
+        record.update(status="failed", stage=e.stage, error=str(e))
+    except Exception as e:
+        record.update(status="failed", stage="pipeline", error=f"{type(e).__name__}: {e}")
+    record["seconds"] = round(time.perf_counter() - start, 3)
+    record["finished_at"] = time.time()
+    return record
+
+
+def run_batch(topics, output_dir, workers=2, api_concurrency=4, retry_failed=False):
+    """
+    Runs every topic not already finished in the manifest and returns a summary
+    with throughput (reels/hour) and failures per stage.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+    finished = load_manifest(manifest_path)
+    skip = ("done", "failed") if not retry_failed else ("done",)
+    pending = [(key, topic) for key, topic in topics if finished.get(key, {}).get("status") not in skip]
+    logger.info(f"{len(topics)} topics, {len(topics) - len(pending)} already finished, {len(pending)} to run")
+
+    for name, value in BATCH_ENV.items():
+        os.environ.setdefault(name, value)
+
+    ctx = multiprocessing.get_context("spawn")
+    # One semaphore shared by every worker caps the provider calls in flight batch-wide
+    api_slots = ctx.BoundedSemaphore(api_concurrency)
+    records = []
+    interrupted = False
+    start = time.perf_counter()
+    with open(manifest_path, "a", encoding="utf-8") as manifest, \
+            ProcessPoolExecutor(max_workers=workers, mp_context=ctx, initializer=init_worker,
+                                initargs=(api_slots,)) as pool:
+        futures = {pool.submit(run_topic, key, topic, topic_dir(output_dir, key, topic)): key
+                   for key, topic in pending}
+        try:
+            for future in as_completed(futures):
+                record = future.result()
+                append_manifest(manifest, record)
+                finished[record["key"]] = record
+                records.append(record)
+                if record["status"] == "done":
+                    logger.info(f"[{len(records)}/{len(pending)}] done: {record['topic']} ({record['seconds']:.1f}s)")
+                else:
+                    logger.warning(f"[{len(records)}/{len(pending)}] failed at {record['stage']}: "
+                                   f"{record['topic']}: {record['error']}")
+        except BrokenProcessPool as e:
+            # A worker died outright; topics without a record run again next time
+            logger.error(f"Worker pool crashed, stopping the batch: {e}")
+            interrupted = True
+    elapsed = time.perf_counter() - start
+
+    done = [r for r in records if r["status"] == "done"]
+    failures = {}
+    for record in records:
+        if record["status"] == "failed":
+            failures[record["stage"]] = failures.get(record["stage"], 0) + 1
+    statuses = [finished.get(key, {}).get("status") for key, _ in topics]
+    return {
+        "manifest": manifest_path,
+        "topics": len(topics),
+        "ran": len(records),
+        "done": len(done),
+        "failed": len(records) - len(done),
+        "failures_by_stage": failures,
+        "seconds": round(elapsed, 3),
+        "reels_per_hour": round(len(done) * 3600 / elapsed, 2) if elapsed and done else 0.0,
+        "mean_reel_seconds": round(sum(r["seconds"] for r in done) / len(done), 3) if done else None,
+        "interrupted": interrupted,
+        "total": {
+            "done": statuses.count("done"),
+            "failed": statuses.count("failed"),
+            "remaining": len(topics) - statuses.count("done") - statuses.count("failed"),
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate one reel per topic from a JSONL or CSV file.")
+    parser.add_argument("topics", help="topics file (.jsonl or .csv)")
+    parser.add_argument("--output-dir", default=os.path.join("static", "output", "batch"),
+                        help="one sub-directory per topic, plus manifest.jsonl")
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("REEL_BATCH_WORKERS", 2)),
+                        help="reels rendered at the same time, one process each")
+    parser.add_argument("--api-concurrency", type=int,
+                        default=int(os.environ.get("REEL_BATCH_API_CONCURRENCY", 4)),
+                        help="LLM, TTS and image calls in flight across all workers")
+    parser.add_argument("--retry-failed", action="store_true", help="run topics that failed last time again")
+    parser.add_argument("--output", help="also write the JSON summary to this file")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=os.environ.get("REEL_LOG_LEVEL", "INFO").upper(),
+                        format="%(asctime)s %(name)s %(levelname)s %(message)s")
+    summary = run_batch(read_topics(args.topics), args.output_dir, workers=max(1, args.workers),
+                        api_concurrency=max(1, args.api_concurrency), retry_failed=args.retry_failed)
+
+    text = json.dumps(summary, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    if summary["interrupted"] or summary["failed"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,701 @@
+"""
+Offline benchmarks for the reel pipeline.
+
+Gemini, Pollinations and gTTS are replaced by local fakes (the stub LLM and TTS
+backends and a fake Pollinations server), so every number is reproducible
+without network access or API keys. Results are JSON; write them with
+--output and diff them across commits to spot regressions.
+
+    python benchmark.py all --scenes 5 --size 1024 --fps 24 --output bench.json
+    python benchmark.py render --scenes 3 --size 512 --fps 12
+    python benchmark.py render --profile preview
+    python benchmark.py startup
+    python benchmark.py limiter
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+# Local fakes for every provider; set before any pipeline singleton is created
+OFFLINE_ENV = {
+    "REEL_LLM_BACKEND": "stub",
+    "REEL_TTS_BACKEND": "stub",
+    "REEL_CACHE": "0",  # measure real work, not cache hits
+}
+
+
+def make_test_image(size=(1024, 1024)):
+    # Gradient with some texture so resampling does real work
+    w, h = size
+    yy, xx = np.mgrid[0:h, 0:w]
+    return np.stack([xx % 256, yy % 256, (xx ^ yy) % 256], axis=-1).astype(np.uint8)
+
+
+def bench_motion(duration=5.0, fps=24, size=(1024, 1024)):
+    """
+    Frames/sec of the Ken Burns zoom: the old per-frame vfx.Resize path versus
+    the precomputed KenBurns engine, plus how far apart their frames are.
+    """
+    from moviepy import ImageClip, CompositeVideoClip, vfx
+    from pipeline.motion import KenBurns
+
+    image = make_test_image(size)
+    n_frames = int(duration * fps)
+    times = [n / fps for n in range(n_frames)]
+
+    legacy = CompositeVideoClip(
+        [ImageClip(image).with_duration(duration).with_effects([vfx.Resize(lambda t: 1 + 0.04 * t)])],
+        size=size,
+    )
+    start = time.perf_counter()
+    legacy_frames = [legacy.get_frame(t) for t in times]
+    legacy_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    motion = KenBurns(image, duration, fps=fps, size=size)
+    setup_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    diffs = []
+    for n, t in enumerate(times):
+        frame = motion.frame_at(t)
+        if n % max(1, n_frames // 10) == 0:
+            diffs.append(float(np.abs(frame.astype(np.int16) - legacy_frames[n]).mean()))
+    engine_seconds = time.perf_counter() - start
+
+    return {
+        "frames": n_frames,
+        "size": list(size),
+        "legacy_fps": n_frames / legacy_seconds,
+        "engine_fps": n_frames / engine_seconds,
+        "engine_setup_seconds": setup_seconds,
+        "speedup": legacy_seconds / engine_seconds,
+        "mean_abs_diff": sum(diffs) / len(diffs),
+    }
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def latency_summary(latencies, failures, seconds):
+    return {
+        "downloads": len(latencies),
+        "failures": failures,
+        "throughput_per_s": len(latencies) / seconds,
+        "p50_s": percentile(latencies, 50),
+        "p95_s": percentile(latencies, 95),
+        "p99_s": percentile(latencies, 99),
+    }
+
+
+def bench_http(requests_count=40, latency=0.2, jitter=0.1, slow_fraction=0.05, slow_latency=2.0,
+               error_rate=0.05, concurrency=8, hedge_after=0.6):
+    """
+    Image download throughput and tail latency against a local fake Pollinations:
+    the old bare requests.get on 2 threads versus the pooled HttpClient.
+    """
+    import requests
+    from concurrent.futures import ThreadPoolExecutor
+    from pipeline.fake_servers import FakePollinations
+    from pipeline.http_client import HttpClient, HttpError
+
+    def run(fetch, workers):
+        latencies = []
+        failures = [0]
+
+        def one(n):
+            start = time.perf_counter()
+            try:
+                fetch(f"{server.base_url}/prompt/bench%20{n}?width=1024&height=1024&seed={n}")
+                latencies.append(time.perf_counter() - start)
+            except Exception:
+                failures[0] += 1
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(one, range(requests_count)))
+        return latency_summary(latencies, failures[0], time.perf_counter() - start)
+
+    def legacy_fetch(url):
+        resp = requests.get(url, timeout=30)
+        if resp.status_code != 200:
+            raise HttpError(f"HTTP {resp.status_code}", status=resp.status_code)
+        return resp.content
+
+    server_args = dict(latency=latency, jitter=jitter, slow_fraction=slow_fraction, slow_latency=slow_latency,
+                       error_rate=error_rate, seed=1)
+    with FakePollinations(**server_args) as server:
+        legacy = run(legacy_fetch, 2)
+    with FakePollinations(**server_args) as server:
+        client = HttpClient(max_concurrency=concurrency, backoff=0.05, hedge_after=hedge_after)
+        pooled = run(client.get_bytes, concurrency)
+        pooled["client_stats"] = dict(client.stats)
+        client.close()
+
+    return {"server": server_args, "legacy": legacy, "pooled": pooled}
+
+
+def bench_coalesce(users=8, scenes=3, latency=0.2):
+    """
+    users submit the same prompt at once: provider calls and wall time for the
+    script, image and TTS stages, with and without single-flight coalescing.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    import pipeline.cache as cache_module
+    import pipeline.script_writer as script_writer
+    import pipeline.voiceover as voiceover
+    from pipeline.coalesce import get_single_flight
+    from pipeline.fake_servers import FakePollinations
+    from pipeline.image_generator import fetch_backgrounds, fetch_image, scene_image_prompt
+
+    calls = {"script": 0, "tts": 0}
+
+    class CountingLLM(script_writer.StubBackend):
+        def complete(self, prompt):
+            calls["script"] += 1
+            return super().complete(prompt)
+
+    class CountingTTS(voiceover.StubTTSBackend):
+        def synthesize(self, text):
+            calls["tts"] += 1
+            time.sleep(latency)
+            return super().synthesize(text)
+
+    os.environ["REEL_LLM_STUB_LINES"] = str(scenes)
+    script_writer._backend = CountingLLM(latency=latency, lines=scenes)
+    voiceover._backend = CountingTTS()
+
+    def user(n):
+        # Identical prompts up to spacing, as typed by different users
+        lines, background = script_writer.write_script_bundle("trending  topic" if n % 2 else "trending topic")
+        fetch_backgrounds(background)
+        for i, line in enumerate(lines):
+            fetch_image(scene_image_prompt(line), f"scene {i + 1}")
+            voiceover.synthesize_line(line)
+
+    def run(enabled):
+        os.environ["REEL_COALESCE"] = "1" if enabled else "0"
+        calls.update(script=0, tts=0)
+        # A cold cache per run: deterministic image seeds, and no hits left over from the last run
+        with tempfile.TemporaryDirectory() as cache_dir, FakePollinations(latency=latency, seed=1) as server:
+            os.environ.update(REEL_CACHE="1", REEL_CACHE_DIR=cache_dir, POLLINATIONS_BASE_URL=server.base_url)
+            cache_module._cache = None
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=users) as executor:
+                list(executor.map(user, range(users)))
+            seconds = time.perf_counter() - start
+        return dict(calls, images=server.counts["requests"], seconds=seconds)
+
+    try:
+        baseline = run(False)
+        coalesced = run(True)
+    finally:
+        os.environ.update(OFFLINE_ENV)
+        os.environ.pop("REEL_COALESCE", None)
+        cache_module._cache = None
+        script_writer._backend = None
+        voiceover._backend = None
+    return {"users": users, "scenes": scenes, "latency_s": latency, "uncoalesced": baseline,
+            "coalesced": coalesced, "single_flight": get_single_flight().stats()}
+
+
+def bench_limiter(batch_requests=48, interactive_requests=6, latency=0.2, capacity=4, threads=16,
+                  hedge_after=15.0):
+    """
+    A big batch job and a small interactive one downloading at once from a fake
+    Pollinations that 429s past capacity calls in flight: without limits, and
+    through the adaptive limiter (AIMD window, fair queuing by job). The client
+    hedges like the app's default one (REEL_HTTP_HEDGE_AFTER).
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    from pipeline import limits
+    from pipeline.fake_servers import FakePollinations
+    from pipeline.http_client import HttpClient
+    from pipeline.metrics import set_job
+
+    def run(provider):
+        client = HttpClient(max_concurrency=threads, retries=6, backoff=0.05, hedge_after=hedge_after or None,
+                            provider=provider)
+        finished = {"batch": [], "interactive": []}
+        failures = {"batch": 0, "interactive": 0}
+
+        def one(job, n):
+            set_job(job)
+            try:
+                client.get_bytes(f"{server.base_url}/prompt/{job}%20{n}?width=256&height=256&seed={n}")
+                finished[job].append(time.perf_counter() - start)
+            except Exception:
+                failures[job] += 1
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as batch, ThreadPoolExecutor(max_workers=threads) as interactive:
+            for n in range(batch_requests):
+                batch.submit(one, "batch", n)
+            # The interactive job arrives once the batch has filled every queue
+            time.sleep(latency / 2)
+            interactive_start = time.perf_counter() - start
+            for n in range(interactive_requests):
+                interactive.submit(one, "interactive", n)
+        client.close()
+        return {
+            "seconds": time.perf_counter() - start,
+            "failures": failures,
+            "server_throttled": server.counts["throttled"],
+            "server_max_in_flight": server.counts["max_in_flight"],
+            "retries": client.stats.get("retries", 0),
+            "batch_done_s": max(finished["batch"], default=None),
+            "interactive_done_s": (max(finished["interactive"]) - interactive_start
+                                   if finished["interactive"] else None),
+        }
+
+    with FakePollinations(latency=latency, capacity=capacity, seed=1) as server:
+        unlimited = run(None)
+    limits._limiters["pollinations"] = limits.AdaptiveLimiter("pollinations", initial=8, max_limit=8)
+    with FakePollinations(latency=latency, capacity=capacity, seed=1) as server:
+        limited = run("pollinations")
+        limited["limiter"] = limits.get_limiter("pollinations").snapshot()
+    return {"capacity": capacity, "latency_s": latency, "hedge_after_s": hedge_after,
+            "batch_requests": batch_requests, "interactive_requests": interactive_requests, "unlimited": unlimited, "adaptive": limited}
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process and of its (render) children, in MB."""
+    self_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children_kb = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024  # bytes on macOS, KB on Linux
+    return {"self": self_kb / scale, "children": children_kb / scale}
+
+
+def silent_mp3(path, seconds):
+    from pipeline.voiceover import StubTTSBackend
+
+    with open(path, "wb") as f:
+        f.write(StubTTSBackend.FRAME * int(round(seconds / StubTTSBackend.FRAME_SECONDS)))
+    return path
+
+
+def bench_script(topics=20, latency=0.3, concurrency=8):
+    """Script+background latency per topic, sequential and batched, against the stub LLM."""
+    os.environ["REEL_LLM_STUB_LATENCY"] = str(latency)
+    import pipeline.script_writer as script_writer
+
+    script_writer._backend = None  # pick up the latency setting
+    names = [f"benchmark topic {n}" for n in range(topics)]
+
+    latencies = []
+    for topic in names[:min(5, topics)]:
+        start = time.perf_counter()
+        script_writer.write_script_bundle(topic)
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    script_writer.write_script_bundles(names, max_workers=concurrency)
+    batch_seconds = time.perf_counter() - start
+
+    return {
+        "stub_latency_s": latency,
+        "single_p50_s": percentile(latencies, 50),
+        "batch_topics": topics,
+        "batch_seconds": batch_seconds,
+        "batch_topics_per_s": topics / batch_seconds,
+    }
+
+
+def bench_images(scenes=5, latency=0.2):
+    """Image fetch + merge throughput for one job against the fake Pollinations server."""
+    from pipeline.fake_servers import FakePollinations
+    from pipeline.image_generator import generate_images
+
+    lines = [f"benchmark scene {n}" for n in range(scenes)]
+    with FakePollinations(latency=latency, jitter=latency / 2, seed=1) as server:
+        os.environ["POLLINATIONS_BASE_URL"] = server.base_url
+        with tempfile.TemporaryDirectory() as output_dir:
+            start = time.perf_counter()
+            paths, _ = generate_images(lines, "benchmark background", output_dir=output_dir)
+            seconds = time.perf_counter() - start
+        requests_made = server.counts["requests"]
+
+    return {
+        "scenes": scenes,
+        "server_latency_s": latency,
+        "seconds": seconds,
+        "scenes_per_s": len(paths) / seconds,
+        "http_requests": requests_made,
+    }
+
+
+def bench_text(calls=50, size=(1024, 1024)):
+    """create_text_clip_pil calls/sec, cold (distinct captions) and warm (memoized)."""
+    from pipeline.video_maker import create_text_clip_pil
+
+    texts = [f"Caption number {n}: a fairly long line of narration that has to wrap over several lines "
+             f"and shrink to fit the frame." for n in range(calls)]
+    start = time.perf_counter()
+    for text in texts:
+        create_text_clip_pil(text, size=size)
+    cold = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for text in texts:
+        create_text_clip_pil(text, size=size)
+    warm = time.perf_counter() - start
+
+    return {"calls": calls, "cold_calls_per_s": calls / cold, "warm_calls_per_s": calls / warm}
+
+
+def bench_render(scenes=3, size=(1024, 1024), fps=24, seconds_per_scene=3.0, render_mode="segments", profile=None):
+    """
+    create_video frames/sec and output size for synthetic scenes.
+    With a profile name, its frame size, frame rate and encoder settings are used instead of size/fps.
+    """
+    from pipeline.profiles import final_profile, get_profile
+    from pipeline.video_maker import create_video
+
+    if profile:
+        render_profile = get_profile(profile)
+        size, fps = render_profile.size, render_profile.fps
+    else:
+        render_profile = final_profile()
+
+    lines = [f"Scene {n + 1}: benchmark caption for the render stage." for n in range(scenes)]
+    images = [make_test_image((1024, 1024)) for _ in range(scenes)]
+    with tempfile.TemporaryDirectory() as output_dir:
+        audio_path = silent_mp3(os.path.join(output_dir, "voice.mp3"), seconds_per_scene * scenes)
+        start = time.perf_counter()
+        video_path = create_video(images, audio_path, lines, output_dir=output_dir, render_mode=render_mode,
+                                  scene_durations=[seconds_per_scene] * scenes, size=size, fps=fps,
+                                  profile=render_profile)
+        seconds = time.perf_counter() - start
+        output_bytes = os.path.getsize(video_path) if video_path else 0
+
+    frames = int(round(seconds_per_scene * fps)) * scenes
+    return {
+        "render_mode": render_mode,
+        "profile": render_profile.name,
+        "scenes": scenes,
+        "size": list(size),
+        "fps": fps,
+        "frames": frames,
+        "seconds": seconds,
+        "frames_per_s": frames / seconds,
+        "output_bytes": output_bytes,
+    }
+
+
+def bench_concat(scenes=3, size=(1024, 1024), fps=24, seconds_per_scene=3.0):
+    """
+    Frames/sec of compose-mode concatenation, without encoding: the per-scene
+    composite clips joined by concatenate_videoclips(method="compose") versus
+    ReelFrames, which blends only the transition windows.
+    """
+    from moviepy import concatenate_videoclips
+    from pipeline.frame_renderer import ReelFrames
+    from pipeline.profiles import ANCHOR_TOP_LEFT
+    from pipeline.video_maker import build_scene_clip
+
+    lines = [f"Scene {n + 1}: benchmark caption for the render stage." for n in range(scenes)]
+    images = [make_test_image((1024, 1024)) for _ in range(scenes)]
+    times = [n / fps for n in range(int(round(seconds_per_scene * fps)) * scenes)]
+
+    start = time.perf_counter()
+    legacy = concatenate_videoclips([build_scene_clip(image, seconds_per_scene, line, fps=fps, size=size)
+                                     for image, line in zip(images, lines)], method="compose")
+    legacy_frames = [legacy.get_frame(t) for t in times]
+    legacy_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    reel = ReelFrames([(image, seconds_per_scene, line) for image, line in zip(images, lines)], size, fps,
+                      ANCHOR_TOP_LEFT)
+    diff = 0
+    for n, t in enumerate(times):
+        frame = reel.frame_at(t)
+        if n % max(1, len(times) // 10) == 0:
+            diff = max(diff, int(np.abs(frame.astype(np.int16) - legacy_frames[n]).max()))
+    windowed_seconds = time.perf_counter() - start
+
+    return {
+        "scenes": scenes,
+        "size": list(size),
+        "fps": fps,
+        "frames": len(times),
+        "frame_counts": reel.counts,
+        "legacy_fps": len(times) / legacy_seconds,
+        "windowed_fps": len(times) / windowed_seconds,
+        "speedup": legacy_seconds / windowed_seconds,
+        "max_abs_diff": diff,
+    }
+
+
+def bench_overlay(frames=48, size=(1024, 1024)):
+    """
+    Per-frame cost of drawing a static caption over a frame: MoviePy compositing
+    the old full-frame RGBA overlay, MoviePy compositing the bounding-box
+    sprite, and the renderers' in-place blend of the premultiplied sprite.
+    """
+    from moviepy import CompositeVideoClip, ImageClip
+    from pipeline.frame_renderer import blend_premultiplied, caption_style
+    from pipeline.text_layout import caption_sprite
+    from pipeline.video_maker import create_text_clip_pil
+
+    text = "A caption-heavy benchmark line that wraps onto a second line of text."
+    fontsize, stroke_width, margin = caption_style(size)
+    background = ImageClip(make_test_image(size)).with_duration(frames)
+    x, y, sprite = caption_sprite(text, tuple(size), fontsize, "white", stroke_width, "black", margin)
+
+    def per_frame_ms(clip):
+        start = time.perf_counter()
+        for n in range(frames):
+            clip.get_frame(n)
+        return (time.perf_counter() - start) / frames * 1000
+
+    full = CompositeVideoClip([background, create_text_clip_pil(text, size, fontsize, stroke_width=stroke_width,
+                                                                bottom_margin=margin).with_duration(frames)])
+    bbox = CompositeVideoClip([background, ImageClip(sprite).with_position((x, y)).with_duration(frames)])
+    full_ms = per_frame_ms(full)
+    bbox_ms = per_frame_ms(bbox)
+
+    rgb = sprite[..., :3].astype(np.uint16)
+    alpha = sprite[..., 3].astype(np.uint16)[..., None]
+    premultiplied, inverse = rgb * alpha, 255 - alpha
+    scratch = np.empty(rgb.shape, dtype=np.uint16)
+    frame = make_test_image(size)
+    h, w = sprite.shape[:2]
+    start = time.perf_counter()
+    for _ in range(frames):
+        blend_premultiplied(frame[y:y + h, x:x + w], premultiplied, inverse, scratch)
+    premultiplied_ms = (time.perf_counter() - start) / frames * 1000
+
+    return {
+        "size": list(size),
+        "sprite_size": [w, h],
+        "covered_fraction": w * h / (size[0] * size[1]),
+        "full_frame_composite_ms": full_ms,
+        "bbox_composite_ms": bbox_ms,
+        "premultiplied_blend_ms": premultiplied_ms,
+        "speedup": full_ms / premultiplied_ms,
+    }
+
+
+def bench_e2e(scenes=5, latency=0.2):
+    """One full run_reel job with every provider faked, including the time to the first preview."""
+    from pipeline.fake_servers import FakePollinations
+    from pipeline.jobs import run_reel
+    import pipeline.script_writer as script_writer
+
+    os.environ["REEL_LLM_STUB_LINES"] = str(scenes)
+    os.environ["REEL_LLM_STUB_LATENCY"] = str(latency)
+    script_writer._backend = None
+
+    with FakePollinations(latency=latency, jitter=latency / 2, seed=1) as server:
+        os.environ["POLLINATIONS_BASE_URL"] = server.base_url
+        with tempfile.TemporaryDirectory() as output_dir:
+            preview_at = []
+            start = time.perf_counter()
+            result = run_reel("benchmark topic", output_dir,
+                              on_preview=lambda path: preview_at.append(time.perf_counter() - start))
+            seconds = time.perf_counter() - start
+            output_bytes = os.path.getsize(result["video_path"])
+
+    return {
+        "scenes": len(result["script_lines"]),
+        "seconds": seconds,
+        "preview_seconds": preview_at[0] if preview_at else None,
+        "output_bytes": output_bytes,
+        "stage_seconds": result["stage_seconds"],
+        "critical_path": result["critical_path"],
+    }
+
+
+# Runs in a fresh interpreter, so nothing is imported or warmed up beforehand. It is run
+# from a file like a real server script: spawned render workers re-import it (and so app)
+# as __mp_main__, and any process app starts from there shows up in worker_processes.
+STARTUP_PROBE = r"""
+import json, os, sys, time
+
+start = time.perf_counter()
+import app
+import_seconds = time.perf_counter() - start
+
+
+def descendants(pid):
+    children = {}
+    for entry in os.listdir("/proc"):
+        if entry.isdigit():
+            try:
+                with open(f"/proc/{entry}/stat") as f:
+                    ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+            except (OSError, ValueError, IndexError):
+                continue
+            children.setdefault(ppid, []).append(int(entry))
+    found, stack = [], [pid]
+    while stack:
+        for child in children.get(stack.pop(), []):
+            found.append(child)
+            stack.append(child)
+    return found
+
+
+if __name__ == "__main__":
+    result = {
+        "import_app_s": import_seconds,
+        "heavy_modules_at_import": sorted(m for m in ("numpy", "PIL", "moviepy", "google.generativeai")
+                                          if m in sys.modules),
+    }
+    client = app.app.test_client()
+    for name in ("first_get_s", "second_get_s"):
+        start = time.perf_counter()
+        client.get("/")
+        result[name] = time.perf_counter() - start
+
+    if os.environ.get("BENCH_REEL"):
+        from pipeline.jobs import run_reel
+        from pipeline.warmup import prewarm_enabled, wait_prewarmed
+
+        if prewarm_enabled():
+            start = time.perf_counter()
+            wait_prewarmed()
+            result["prewarm_wait_s"] = time.perf_counter() - start
+        start = time.perf_counter()
+        run_reel("startup benchmark", os.path.join("static", "output", "startup"))
+        result["first_reel_s"] = time.perf_counter() - start
+        # Give any process started by a re-imported app time to show up
+        time.sleep(2)
+        result["worker_processes"] = len(descendants(os.getpid()))
+    else:
+        # What the lazy imports defer until the first render
+        start = time.perf_counter()
+        import moviepy, pipeline.frame_renderer
+        result["render_stack_import_s"] = time.perf_counter() - start
+    print(json.dumps(result))
+"""
+
+
+def bench_startup(scenes=2, latency=0.05, runs=3):
+    """
+    Cold start of the web app in fresh processes: import time, the first and
+    second GET /, and the first reel with and without REEL_PREWARM.
+    """
+    from pipeline.fake_servers import FakePollinations
+
+    root = os.path.dirname(os.path.abspath(__file__))
+
+    def probe(output_dir, **env):
+        child_env = dict(os.environ, PYTHONPATH=root, REEL_LOG_LEVEL="WARNING", REEL_LLM_STUB_LINES=str(scenes),
+                         **env)
+        probe_path = os.path.join(output_dir, "startup_probe.py")
+        with open(probe_path, "w") as f:
+            f.write(STARTUP_PROBE)
+        proc = subprocess.run([sys.executable, probe_path], cwd=output_dir, env=child_env,
+                              capture_output=True, text=True, check=True, timeout=300)
+        return json.loads(proc.stdout.strip().splitlines()[-1])
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        # Best of a few runs: the OS page cache makes the first one slower
+        cold = min((probe(output_dir, REEL_PREWARM="0") for _ in range(runs)), key=lambda r: r["import_app_s"])
+        with FakePollinations(latency=latency, seed=1) as server:
+            reels = {
+                # Small, preview-sized reels, so start-up costs are not lost in encode time
+                mode: probe(output_dir, REEL_PREWARM=flag, BENCH_REEL="1", POLLINATIONS_BASE_URL=server.base_url,
+                            REEL_FINAL_PROFILE="preview", REEL_PREVIEW_PROFILE="none")
+                for mode, flag in (("lazy", "0"), ("prewarmed", "1"))
+            }
+
+    return {
+        "import_app_s": cold["import_app_s"],
+        "heavy_modules_at_import": cold["heavy_modules_at_import"],
+        "render_stack_import_s": cold["render_stack_import_s"],
+        "first_get_s": cold["first_get_s"],
+        "second_get_s": cold["second_get_s"],
+        "scenes": scenes,
+        "first_reel_lazy_s": reels["lazy"]["first_reel_s"],
+        "first_reel_prewarmed_s": reels["prewarmed"]["first_reel_s"],
+        "prewarm_s": reels["prewarmed"].get("prewarm_wait_s"),
+        # Render workers (plus ffmpeg) left once the reel is done; more means workers spawned workers
+        "worker_processes_lazy": reels["lazy"]["worker_processes"],
+        "worker_processes_prewarmed": reels["prewarmed"]["worker_processes"],
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                               cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    from pipeline.profiles import PROFILES
+
+    parser = argparse.ArgumentParser(description="Offline benchmarks for the reel pipeline.")
+    parser.add_argument("bench", choices=("all", "script", "images", "text", "render", "e2e", "motion", "http",
+                                          "startup", "limiter", "coalesce", "concat",
+                                          "overlay"))
+    parser.add_argument("--scenes", type=int, default=5, help="scenes per reel (e2e is capped at 6)")
+    parser.add_argument("--size", type=int, default=1024, help="square output resolution")
+    parser.add_argument("--fps", type=int, default=24)
+    parser.add_argument("--seconds-per-scene", type=float, default=3.0)
+    parser.add_argument("--render-mode", default="segments", choices=("segments", "pipe", "compose"))
+    parser.add_argument("--profile", choices=sorted(PROFILES),
+                        help="render profile for the render benchmark (overrides --size and --fps)")
+    parser.add_argument("--latency", type=float, default=0.2, help="simulated provider latency (s)")
+    parser.add_argument("--requests", type=int, default=40, help="downloads for the http benchmark")
+    parser.add_argument("--error-rate", type=float, default=0.05)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--output", help="also write the JSON results to this file")
+    args = parser.parse_args()
+
+    os.environ.update(OFFLINE_ENV)
+    size = (args.size, args.size)
+    benches = {
+        "script": lambda: bench_script(latency=args.latency, concurrency=args.concurrency),
+        "images": lambda: bench_images(args.scenes, args.latency),
+        "text": lambda: bench_text(size=size),
+        "render": lambda: bench_render(args.scenes, size, args.fps, args.seconds_per_scene, args.render_mode,
+                                       args.profile),
+        "e2e": lambda: bench_e2e(min(args.scenes, 6), args.latency),
+        "motion": lambda: bench_motion(args.seconds_per_scene, args.fps, size),
+        "http": lambda: bench_http(args.requests, args.latency, error_rate=args.error_rate,
+                                   concurrency=args.concurrency),
+        "startup": lambda: bench_startup(min(args.scenes, 3)),
+        "limiter": lambda: bench_limiter(latency=args.latency),
+        "concat": lambda: bench_concat(args.scenes, size, args.fps, args.seconds_per_scene),
+        "overlay": lambda: bench_overlay(size=size),
+        "coalesce": lambda: bench_coalesce(args.concurrency, min(args.scenes, 6), args.latency),
+    }
+    selected = ["script", "images", "text", "render", "e2e", "startup"] if args.bench == "all" else [args.bench]
+
+    results = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.time(),
+            "python": platform.python_version(),
+            "cpu_count": os.cpu_count(),
+            "params": vars(args),
+        },
+    }
+    for name in selected:
+        print(f"Running {name} benchmark...", file=sys.stderr)
+        results[name] = benches[name]()
+    results["peak_rss_mb"] = peak_rss_mb()
+
+    text = json.dumps(results, indent=2, default=str)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
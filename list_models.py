@@ -1,5 +1,4 @@
 import os
-import google.generativeai as genai
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -8,6 +7,9 @@ api_key = os.environ.get("GEMINI_API_KEY")
 if not api_key:
     print("No GEMINI_API_KEY found.")
 else:
+    # Only worth importing once there is a key to use
+    import google.generativeai as genai
+
     genai.configure(api_key=api_key)
     print("Listing available models...")
     try:
@@ -0,0 +1,191 @@
+import hashlib
+import os
+import re
+import shutil
+import threading
+import time
+
+DEFAULT_ARTIFACT_DIR = os.path.join("static", "output", "artifacts")
+NAME_RE = re.compile(r"^([0-9a-f]{64})(\.[a-z0-9]{1,5})$")
+
+
+def file_hash(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ArtifactStore:
+    """
+    Content-addressed store for finished media (reels, previews, UI backgrounds).
+
+    Files live under <root>/<hh>/<sha256><ext>. A name is the hash of the
+    bytes, so an entry never changes once written: identical outputs are
+    stored once, and every entry can be served with a strong ETag and an
+    immutable Cache-Control. An entry's atime records its last publish or
+    download. gc() drops entries idle for longer than max_age, then the least
+    recently used ones until the store fits in max_bytes. Names in use by
+    live jobs are pinned (put(..., pin=True) until unpin()) and never removed.
+    """
+
+    def __init__(self, root=DEFAULT_ARTIFACT_DIR, max_bytes=5 * 1024 * 1024 * 1024, max_age=30 * 24 * 3600):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self.counts = {"stored": 0, "deduplicated": 0, "removed": 0, "bytes_removed": 0}
+        self._pins = {}  # name -> number of holders
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, name):
+        """Filesystem path of an artifact name, or None if name is not a valid artifact name."""
+        match = NAME_RE.match(name)
+        if not match:
+            return None
+        return os.path.join(self.root, match.group(1)[:2], name)
+
+    def put(self, src, pin=False):
+        """
+        Stores a copy of the file at src (unless the same bytes are already stored). Returns its name.
+        With pin, the name stays pinned until unpin(name).
+        """
+        ext = os.path.splitext(src)[1].lower()
+        name = file_hash(src) + ext
+        # Pinned before the existence check, so gc() cannot remove an entry this call deduplicates against
+        with self._lock:
+            self._pins[name] = self._pins.get(name, 0) + 1
+        try:
+            self._store(src, name)
+        except BaseException:
+            self.unpin(name)
+            raise
+        if not pin:
+            self.unpin(name)
+        return name
+
+    def unpin(self, name):
+        with self._lock:
+            count = self._pins.get(name, 0) - 1
+            if count > 0:
+                self._pins[name] = count
+            else:
+                self._pins.pop(name, None)
+
+    def _store(self, src, name):
+        path = self.path(name)
+        if os.path.exists(path):
+            self.touch(name)
+            with self._lock:
+                self.counts["deduplicated"] += 1
+            return
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Copied, not linked: the job directory's copy may still be rewritten, the artifact never is
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            shutil.copyfile(src, tmp_path)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        with self._lock:
+            self.counts["stored"] += 1
+
+    def touch(self, name):
+        """Records an access for retention without changing the write time."""
+        path = self.path(name)
+        try:
+            os.utime(path, (time.time(), os.stat(path).st_mtime))
+        except OSError:
+            pass
+
+    def gc(self, pinned=()):
+        """Removes idle entries, then least recently used ones until under max_bytes. Pinned names stay."""
+        pinned = set(pinned)
+        now = time.time()
+        entries = []
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                if name.endswith(".tmp"):
+                    # Left behind by a crashed copy
+                    if now - st.st_mtime > 3600:
+                        self._remove(path, st.st_size)
+                    continue
+                if name in pinned:
+                    entries.append((float("inf"), st.st_size, path, name))
+                elif self.max_age and now - st.st_atime > self.max_age:
+                    if not self._remove(path, st.st_size, name):
+                        entries.append((float("inf"), st.st_size, path, name))
+                else:
+                    entries.append((st.st_atime, st.st_size, path, name))
+
+        total = sum(size for _, size, _, _ in entries)
+        entries.sort()
+        for atime, size, path, name in entries:
+            if total <= self.max_bytes or atime == float("inf"):
+                break
+            if self._remove(path, size, name):
+                total -= size
+        return total
+
+    def _remove(self, path, size, name=None):
+        # Checked and removed under the lock, so a put() pinning name either sees the file gone or keeps it
+        with self._lock:
+            if name in self._pins:
+                return False
+            try:
+                os.remove(path)
+            except OSError:
+                return False
+            self.counts["removed"] += 1
+            self.counts["bytes_removed"] += size
+        return True
+
+    def stats(self):
+        total = 0
+        count = 0
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                if not name.endswith(".tmp"):
+                    try:
+                        total += os.path.getsize(os.path.join(dirpath, name))
+                        count += 1
+                    except OSError:
+                        pass
+        with self._lock:
+            return dict(self.counts, artifacts=count, bytes_stored=total, max_bytes=self.max_bytes,
+                        max_age=self.max_age)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def artifacts_enabled():
+    return os.environ.get("REEL_ARTIFACTS", "1").lower() not in ("0", "false", "no", "off")
+
+
+def get_artifact_store():
+    """
+    Returns the process-wide artifact store, or None when it is disabled (REEL_ARTIFACTS=0).
+    Configured with REEL_ARTIFACT_DIR, REEL_ARTIFACT_MAX_MB (default 5120) and
+    REEL_ARTIFACT_MAX_AGE (seconds since last access, default 30 days).
+    """
+    global _store
+    if not artifacts_enabled():
+        return None
+    with _store_lock:
+        if _store is None:
+            _store = ArtifactStore(
+                root=os.environ.get("REEL_ARTIFACT_DIR", DEFAULT_ARTIFACT_DIR),
+                max_bytes=int(float(os.environ.get("REEL_ARTIFACT_MAX_MB", 5120)) * 1024 * 1024),
+                max_age=int(os.environ.get("REEL_ARTIFACT_MAX_AGE", 30 * 24 * 3600)),
+            )
+        return _store
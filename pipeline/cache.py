@@ -0,0 +1,218 @@
+import hashlib
+import json
+import logging
+import os
+import random
+import threading
+import time
+
+from pipeline.metrics import CACHE_LOOKUPS, annotate
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = os.path.join(".cache", "reel")
+
+
+class DiskCache:
+    """
+    Content-addressed artifact cache shared by every pipeline stage.
+
+    Entries live under <root>/<stage>/<hh>/<hash>. The file's mtime records
+    when it was written (used for TTL expiry) and its atime is bumped on every
+    hit (used for LRU eviction once the total size goes over max_bytes).
+    Eviction scans the whole tree, so it frees down to low_water * max_bytes:
+    the writes after it have that much room before the next scan.
+    """
+
+    def __init__(self, root=DEFAULT_CACHE_DIR, max_bytes=1024 * 1024 * 1024, ttl=7 * 24 * 3600, low_water=0.9):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.low_water = low_water
+        self._lock = threading.Lock()
+        self._total_bytes = None
+        self._evicting = False
+        self.hits = {}
+        self.misses = {}
+        self.bytes_saved = 0
+        os.makedirs(root, exist_ok=True)
+
+    @staticmethod
+    def make_key(stage, prompt, seed=None, **params):
+        """Hashes the stage name, prompt, seed and parameters into a cache key."""
+        payload = json.dumps({"prompt": prompt, "seed": seed, "params": params}, sort_keys=True, default=str)
+        digest = hashlib.sha256(f"{stage}\0{payload}".encode("utf-8")).hexdigest()
+        return f"{stage}/{digest}"
+
+    def _path(self, key):
+        stage, digest = key.split("/", 1)
+        return os.path.join(self.root, stage, digest[:2], digest)
+
+    def get(self, key):
+        """Returns the cached bytes for key, or None on a miss or expired entry."""
+        stage = key.split("/", 1)[0]
+        path = self._path(key)
+        try:
+            st = os.stat(path)
+            if self.ttl and time.time() - st.st_mtime > self.ttl:
+                self._remove(path, st.st_size)
+                raise FileNotFoundError(path)
+            with open(path, "rb") as f:
+                data = f.read()
+            # Record the access for LRU without touching the write time
+            os.utime(path, (time.time(), st.st_mtime))
+        except OSError:
+            with self._lock:
+                self.misses[stage] = self.misses.get(stage, 0) + 1
+            CACHE_LOOKUPS.inc(stage=stage, result="miss")
+            annotate(cache_hit=False)
+            return None
+
+        with self._lock:
+            self.hits[stage] = self.hits.get(stage, 0) + 1
+            self.bytes_saved += len(data)
+        CACHE_LOOKUPS.inc(stage=stage, result="hit")
+        annotate(cache_hit=True)
+        return data
+
+    def put(self, key, data):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._lock:
+            # Before the write, so the first scan does not count this entry twice
+            self._ensure_total()
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            try:
+                old_size = os.path.getsize(path)
+            except OSError:
+                old_size = 0
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Cache write failed for {key}: {e}")
+            return
+
+        with self._lock:
+            self._total_bytes += len(data) - old_size
+            # One eviction at a time; writers that go over meanwhile leave it to that one
+            over = self._total_bytes > self.max_bytes and not self._evicting
+            if over:
+                self._evicting = True
+        if over:
+            try:
+                self.evict()
+            finally:
+                with self._lock:
+                    self._evicting = False
+
+    def get_json(self, key):
+        data = self.get(key)
+        if data is None:
+            return None
+        try:
+            return json.loads(data.decode("utf-8"))
+        except ValueError:
+            return None
+
+    def put_json(self, key, value):
+        self.put(key, json.dumps(value).encode("utf-8"))
+
+    def evict(self):
+        """Drops expired entries, then least recently used ones until under low_water * max_bytes."""
+        entries = []
+        now = time.time()
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                if name.endswith(".tmp"):
+                    continue
+                path = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                if self.ttl and now - st.st_mtime > self.ttl:
+                    self._remove(path, st.st_size)
+                    continue
+                entries.append((st.st_atime, st.st_size, path))
+
+        with self._lock:
+            self._total_bytes = sum(size for _, size, _ in entries)
+        entries.sort()
+        target = self.max_bytes * self.low_water
+        for _, size, path in entries:
+            with self._lock:
+                if self._total_bytes <= target:
+                    break
+            self._remove(path, size)
+
+    def _remove(self, path, size):
+        try:
+            os.remove(path)
+        except OSError:
+            return
+        with self._lock:
+            if self._total_bytes is not None:
+                self._total_bytes -= size
+
+    def _ensure_total(self):
+        # Called with the lock held; scans the directory once per process
+        if self._total_bytes is None:
+            total = 0
+            for dirpath, _, filenames in os.walk(self.root):
+                for name in filenames:
+                    try:
+                        total += os.path.getsize(os.path.join(dirpath, name))
+                    except OSError:
+                        pass
+            self._total_bytes = total
+
+    def stats(self):
+        with self._lock:
+            self._ensure_total()
+            return {
+                "hits": dict(self.hits),
+                "misses": dict(self.misses),
+                "bytes_saved": self.bytes_saved,
+                "bytes_stored": self._total_bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def cache_enabled():
+    return os.environ.get("REEL_CACHE", "1").lower() not in ("0", "false", "no", "off")
+
+
+def get_cache():
+    """
+    Returns the process-wide cache, or None when caching is disabled (REEL_CACHE=0).
+    Configured with REEL_CACHE_DIR, REEL_CACHE_MAX_MB and REEL_CACHE_TTL (seconds).
+    """
+    global _cache
+    if not cache_enabled():
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = DiskCache(
+                root=os.environ.get("REEL_CACHE_DIR", DEFAULT_CACHE_DIR),
+                max_bytes=int(float(os.environ.get("REEL_CACHE_MAX_MB", 1024)) * 1024 * 1024),
+                ttl=int(os.environ.get("REEL_CACHE_TTL", 7 * 24 * 3600)),
+            )
+        return _cache
+
+
+def seed_for(prompt, salt=""):
+    """
+    Picks the Pollinations seed for a prompt.
+    Deterministic when caching is on so repeated prompts hit the cache;
+    random otherwise, as before.
+    """
+    if not cache_enabled():
+        return random.randint(0, 100000)
+    digest = hashlib.sha256(f"{salt}\0{prompt}".encode("utf-8")).digest()
+    return int.from_bytes(digest[:4], "big") % 100001
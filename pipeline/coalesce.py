@@ -0,0 +1,77 @@
+import os
+import threading
+from concurrent.futures import Future
+
+from pipeline.metrics import COALESCED_CALLS, annotate
+
+
+class SingleFlight:
+    """
+    Coalesces identical calls that overlap in time.
+
+    While a call for (stage, key) is running, later callers with the same key
+    wait for it and get its result (or its exception) instead of running it
+    again. Nothing is kept once the call returns, so a coalesced result is
+    never older than the caller's own request. Results are shared between
+    callers and must not be mutated.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}  # (stage, key) -> Future of the running call
+        self.counts = {}  # stage -> {"calls": ..., "coalesced": ...}
+
+    def do(self, stage, key, fn, *args, **kwargs):
+        with self._lock:
+            future = self._calls.get((stage, key))
+            leader = future is None
+            if leader:
+                future = self._calls[(stage, key)] = Future()
+            counts = self.counts.setdefault(stage, {"calls": 0, "coalesced": 0})
+            counts["calls" if leader else "coalesced"] += 1
+
+        if not leader:
+            COALESCED_CALLS.inc(stage=stage)
+            annotate(coalesced=1)
+            return future.result()
+
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[(stage, key)]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "in_flight": len(self._calls),
+                "stages": {stage: dict(counts) for stage, counts in self.counts.items()},
+                "saved_calls": sum(counts["coalesced"] for counts in self.counts.values()),
+            }
+
+
+_flights = SingleFlight()
+
+
+def coalesce_enabled():
+    return os.environ.get("REEL_COALESCE", "1").lower() not in ("0", "false", "no", "off")
+
+
+def get_single_flight():
+    return _flights
+
+
+def coalesce(stage, key, fn, *args, **kwargs):
+    """
+    Runs fn(*args, **kwargs), or joins an identical call for key already in
+    flight in this process (unless REEL_COALESCE=0).
+    """
+    if not coalesce_enabled():
+        return fn(*args, **kwargs)
+    return _flights.do(stage, key, fn, *args, **kwargs)
@@ -0,0 +1,117 @@
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from pipeline.metrics import in_context, span
+
+
+class DAG:
+    """
+    Minimal dependency-graph executor for pipeline stages.
+
+    Each task names the tasks it needs; its function is called with their
+    results, in the order the dependencies were declared. Tasks run on a
+    thread pool as soon as their inputs are ready, so independent branches
+    overlap. A running task may add() further tasks (e.g. one per scene
+    once the script is known).
+    """
+
+    def __init__(self, max_workers=8):
+        self.max_workers = max_workers
+        self._tasks = {}
+        self._order = []
+        self._lock = threading.Lock()
+        self.results = {}
+        self.timings = {}
+
+    def add(self, name, fn, deps=()):
+        with self._lock:
+            if name in self._tasks:
+                raise ValueError(f"Duplicate task: {name}")
+            self._tasks[name] = (fn, tuple(deps))
+            self._order.append(name)
+
+    def deps(self, name):
+        return self._tasks[name][1]
+
+    def run(self):
+        """
+        Runs every task; returns the results dict keyed by task name.
+        The first task exception stops scheduling and is re-raised once
+        the tasks already running have finished.
+        """
+        running = {}
+        done = set()
+        error = None
+
+        def execute(name, fn, args):
+            start = time.perf_counter()
+            try:
+                # One histogram series per kind of task ("image_3" -> "task.image")
+                kind = re.sub(r"_\d+$", "", name)
+                with span(f"task.{kind}", task=name):
+                    return fn(*args)
+            finally:
+                self.timings[name] = (start, time.perf_counter())
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="reel-dag") as executor:
+            while True:
+                if error is None:
+                    with self._lock:
+                        pending = [n for n in self._order if n not in done and n not in running.values()]
+                        missing = [d for n in pending for d in self._tasks[n][1] if d not in self._tasks]
+                        if missing:
+                            raise ValueError(f"Unknown dependencies: {sorted(set(missing))}")
+                        for name in pending:
+                            fn, deps = self._tasks[name]
+                            if all(d in done for d in deps):
+                                args = [self.results[d] for d in deps]
+                                # Tasks inherit the caller's context (job id, parent span)
+                                running[executor.submit(in_context(execute), name, fn, args)] = name
+
+                if not running:
+                    break
+
+                finished, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+                    try:
+                        self.results[name] = future.result()
+                        done.add(name)
+                    except Exception as e:
+                        if error is None:
+                            error = e
+
+            if error is not None:
+                raise error
+            with self._lock:
+                stuck = [n for n in self._order if n not in done]
+            if stuck:
+                raise ValueError(f"Dependency cycle between: {stuck}")
+
+        return self.results
+
+    def critical_path(self):
+        """
+        Returns (task names, seconds) for the chain of tasks that determined
+        the end-to-end time: starting from the last task to finish, follow
+        whichever dependency finished last.
+        """
+        if not self.timings:
+            return [], 0.0
+        first_start = min(start for start, _ in self.timings.values())
+        name = max(self.timings, key=lambda n: self.timings[n][1])
+        path = [name]
+        while True:
+            deps = [d for d in self.deps(name) if d in self.timings]
+            if not deps:
+                break
+            name = max(deps, key=lambda d: self.timings[d][1])
+            path.append(name)
+        path.reverse()
+        total = self.timings[path[-1]][1] - first_start
+        return path, total
+
+    def durations(self):
+        return {name: end - start for name, (start, end) in self.timings.items()}
@@ -0,0 +1,135 @@
+import io
+import random
+import threading
+import time
+import urllib.parse
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakePollinations:
+    """
+    Local stand-in for image.pollinations.ai, for offline tests and benchmarks.
+
+    Serves GET /prompt/<prompt>?width=&height=&seed= with a PNG whose colour
+    depends on the prompt and seed. Latency and failures are configurable:
+    every response waits latency (+ up to jitter) seconds, slow_fraction of
+    them wait slow_latency instead (the tail), and error_rate / throttle_rate
+    of them answer 503 / 429. With capacity set, any request beyond that many
+    in flight is answered 429 straight away, like a provider enforcing a quota.
+
+        with FakePollinations(latency=0.2) as server:
+            os.environ["POLLINATIONS_BASE_URL"] = server.base_url
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, slow_fraction=0.0, slow_latency=0.0,
+                 error_rate=0.0, throttle_rate=0.0, capacity=None, host="127.0.0.1", port=0, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.slow_fraction = slow_fraction
+        self.slow_latency = slow_latency
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.capacity = capacity
+        self.random = random.Random(seed)
+        self.counts = {"requests": 0, "errors": 0, "throttled": 0, "in_flight": 0, "max_in_flight": 0}
+        self._lock = threading.Lock()
+        self._png_cache = {}
+
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                fake._handle(self)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _png(self, width, height, colour):
+        key = (width, height, colour)
+        if key not in self._png_cache:
+            from PIL import Image
+
+            buf = io.BytesIO()
+            Image.new("RGB", (width, height), colour).save(buf, "PNG", compress_level=1)
+            self._png_cache[key] = buf.getvalue()
+        return self._png_cache[key]
+
+    def _plan(self):
+        """Picks (delay, status) for one request."""
+        with self._lock:
+            r = self.random.random()
+            if self.random.random() < self.slow_fraction:
+                delay = self.slow_latency
+            else:
+                delay = self.latency + self.random.random() * self.jitter
+        if r < self.throttle_rate:
+            return delay, 429
+        if r < self.throttle_rate + self.error_rate:
+            return delay, 503
+        return delay, 200
+
+    def _handle(self, handler):
+        with self._lock:
+            self.counts["requests"] += 1
+            self.counts["in_flight"] += 1
+            self.counts["max_in_flight"] = max(self.counts["max_in_flight"], self.counts["in_flight"])
+            over_capacity = self.capacity is not None and self.counts["in_flight"] > self.capacity
+        try:
+            delay, status = (0, 429) if over_capacity else self._plan()
+            if delay:
+                time.sleep(delay)
+
+            if status != 200:
+                with self._lock:
+                    self.counts["throttled" if status == 429 else "errors"] += 1
+                handler.send_response(status)
+                if status == 429:
+                    handler.send_header("Retry-After", "0")
+                handler.send_header("Content-Length", "0")
+                handler.end_headers()
+                return
+
+            parsed = urllib.parse.urlparse(handler.path)
+            query = urllib.parse.parse_qs(parsed.query)
+            width = int(query.get("width", ["1024"])[0])
+            height = int(query.get("height", ["1024"])[0])
+            seed = int(query.get("seed", ["0"])[0])
+            tone = (zlib.crc32(parsed.path.encode()) + seed) % 4  # a few distinct images per prompt
+            colour = (40 + 50 * tone, (len(parsed.path) * 7) % 256, 200 - 40 * tone)
+            body = self._png(width, height, colour)
+
+            handler.send_response(200)
+            handler.send_header("Content-Type", "image/png")
+            handler.send_header("Content-Length", str(len(body)))
+            handler.end_headers()
+            handler.wfile.write(body)
+        finally:
+            with self._lock:
+                self.counts["in_flight"] -= 1
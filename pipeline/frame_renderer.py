@@ -0,0 +1,243 @@
+import bisect
+import queue
+import subprocess
+import threading
+
+import numpy as np
+
+from pipeline.motion import KenBurns
+from pipeline.text_layout import BOTTOM_MARGIN, caption_sprite
+
+# Same timing as build_scene_clip: the image's CrossFadeIn mask ramps over
+# FADE_IN, the caption appears after CAPTION_START and fades in over CAPTION_FADE
+FADE_IN = 1.0
+CAPTION_START = 0.5
+CAPTION_FADE = 0.5
+
+
+def caption_style(size):
+    """Caption font size, stroke and margin; tuned on the 1024px square frame and scaled with it."""
+    scale = min(size) / 1024
+    return round(50 * scale), max(1, round(2 * scale)), round(BOTTOM_MARGIN * scale)
+
+
+def blend_premultiplied(region, premultiplied, inverse, scratch):
+    """
+    Blends a premultiplied sprite onto region in place:
+    region = (region * inverse + premultiplied) / 255, rounded.
+    region is a uint8 view of the frame; the rest are uint16 arrays of its shape
+    (inverse may have one channel).
+    """
+    np.multiply(region, inverse, out=scratch)
+    scratch += premultiplied
+    scratch += 127
+    scratch //= 255
+    np.copyto(region, scratch, casting="unsafe")
+    return region
+
+
+class SceneFrames:
+    """
+    Draws the frames of one scene (zoom and caption fade-in) into caller-owned
+    buffers. Holds one pre-scaled source image, the caption's bounding-box
+    sprite (premultiplied once per scene) and one scratch buffer, whatever the
+    scene length.
+    """
+
+    def __init__(self, image, duration, text, size, fps, anchor):
+        self.duration = duration
+        self.fps = fps
+        self.motion = KenBurns(image, duration, fps=fps, size=size, anchor=anchor, ring=1)
+        self.sprite = None
+        if text:
+            fontsize, stroke_width, margin = caption_style(size)
+            x, y, rgba = caption_sprite(text, tuple(size), fontsize, "white", stroke_width, "black", margin)
+            if rgba.size:
+                rgb = rgba[..., :3].astype(np.uint16)
+                alpha = rgba[..., 3].astype(np.uint16)[..., None]
+                # Steady frames only need rgb * a and 255 - a, so both are computed here once
+                self.sprite = (x, y, rgb, alpha, rgb * alpha, 255 - alpha)
+        h, w = self.sprite[3].shape[:2] if self.sprite else (0, 0)
+        self._scratch = np.empty((h, w, 3), dtype=np.uint16)
+        # Past this point the image is opaque and the caption fully in: nothing fades
+        self.transition_end = max(FADE_IN, CAPTION_START + CAPTION_FADE) if self.sprite else FADE_IN
+
+    def in_transition(self, t):
+        return t < self.transition_end
+
+    def draw(self, t, out):
+        """Writes the frame at scene time t (seconds) into out, an (h, w, 3) uint8 array."""
+        # The clip version writes the composite's colour and drops its mask. Nothing sits
+        # under the image, so it never visibly fades, except that a fully transparent
+        # composite (t == 0) comes out black.
+        mask = min(t / FADE_IN, 1.0)
+        if mask == 0:
+            out.fill(0)
+            return out
+        self.motion.frame(self.motion.frame_index(t), out=out)
+
+        if self.sprite is not None and t >= CAPTION_START:
+            x, y, rgb, alpha, premultiplied, inverse = self.sprite
+            fade = min((t - CAPTION_START) / CAPTION_FADE, 1.0)
+            if fade < 1.0 or mask < 1.0:
+                # Alpha-compositing the caption over the half-faded image mask gives
+                # it the weight a / (a + mask * (1 - a))
+                a = alpha * (fade / 255)
+                alpha = np.rint(255 * a / (a + mask * (1 - a))).astype(np.uint16)
+                premultiplied = rgb * alpha
+                inverse = 255 - alpha
+            # Integer lerp over the caption's box only
+            h, w = alpha.shape[:2]
+            blend_premultiplied(out[y:y + h, x:x + w], premultiplied, inverse, self._scratch)
+        return out
+
+
+class ReelFrames:
+    """
+    The frames of a whole reel, scenes back to back on one clock, for the
+    MoviePy writer (compose mode). Replaces concatenating per-scene composite
+    clips: only frames in a scene's transition window (the image fade-in and
+    the caption fade) are blended with fade weights. Every other frame is the
+    zoom crop with its caption over the caption's box, and goes to the
+    encoder as is. One scene is held at a time.
+    """
+
+    def __init__(self, scenes, size, fps, anchor):
+        self.scenes = scenes
+        self.size = size
+        self.fps = fps
+        self.anchor = anchor
+        self.starts = []
+        start = 0.0
+        for _, duration, _ in scenes:
+            self.starts.append(start)
+            start += duration
+        self.duration = start
+        self.counts = {"transition": 0, "steady": 0}
+        self._index = None
+        self._scene = None
+        width, height = size
+        self._buf = np.empty((height, width, 3), dtype=np.uint8)
+
+    def frame_at(self, t):
+        """Frame at reel time t, drawn into one reused buffer (valid until the next call)."""
+        index = max(0, bisect.bisect_right(self.starts, t) - 1)
+        if index != self._index:
+            image, duration, text = self.scenes[index]
+            self._scene = SceneFrames(image, duration, text, self.size, self.fps, self.anchor)
+            self._index = index
+        local = t - self.starts[index]
+        self.counts["transition" if self._scene.in_transition(local) else "steady"] += 1
+        return self._scene.draw(local, self._buf)
+
+
+class FramePipe:
+    """
+    Feeds raw RGB frames to an ffmpeg encoder through a small ring of
+    preallocated buffers. One thread draws into a free buffer while another
+    writes the previous one to the pipe, so memory is ring * frame size.
+    """
+
+    def __init__(self, cmd, size, ring=3):
+        width, height = size
+        self._free = queue.Queue()
+        self._filled = queue.Queue()
+        for _ in range(max(2, ring)):
+            self._free.put(np.empty((height, width, 3), dtype=np.uint8))
+        self.error = None
+        self.proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        self._writer = threading.Thread(target=self._write, name="reel-frame-pipe", daemon=True)
+        self._writer.start()
+
+    def _write(self):
+        while True:
+            buf = self._filled.get()
+            if buf is None:
+                break
+            if self.error is None:
+                try:
+                    self.proc.stdin.write(memoryview(buf).cast("B"))
+                except (BrokenPipeError, OSError) as e:
+                    # Keep recycling buffers so the drawing side never blocks
+                    self.error = e
+            self._free.put(buf)
+
+    def next_buffer(self):
+        return self._free.get()
+
+    def push(self, buf):
+        self._filled.put(buf)
+
+    def close(self):
+        """Flushes the ring, waits for ffmpeg and raises if encoding failed."""
+        self._filled.put(None)
+        self._writer.join()
+        try:
+            self.proc.stdin.close()
+        except OSError:
+            pass
+        stderr = self.proc.stderr.read().decode("utf-8", "replace")
+        self.proc.stderr.close()
+        if self.proc.wait() != 0 or self.error is not None:
+            raise RuntimeError(f"ffmpeg failed ({self.proc.returncode}): {stderr.strip() or self.error}")
+
+
+def encoder_command(output_path, profile, audio_path=None, threads=None):
+    from moviepy.config import FFMPEG_BINARY
+
+    width, height = profile.size
+    cmd = [
+        FFMPEG_BINARY, "-y", "-loglevel", "error",
+        "-f", "rawvideo", "-pix_fmt", "rgb24", "-s", f"{width}x{height}", "-r", str(profile.fps), "-i", "-",
+    ]
+    if audio_path:
+        cmd += ["-i", audio_path, "-map", "0:v", "-map", "1:a", "-c:a", "aac", "-b:a", profile.audio_bitrate]
+    else:
+        cmd += ["-an"]
+    cmd += [
+        "-c:v", "libx264", "-preset", profile.preset, *profile.ffmpeg_params(),
+        "-pix_fmt", profile.pixel_format,
+        "-threads", str(threads or profile.threads or 0),
+        "-movflags", "+faststart",
+        output_path,
+    ]
+    return cmd
+
+
+def frame_range(start, duration, fps):
+    """
+    Frame numbers [first, last) of a scene from start to start + duration on
+    the reel clock. Rounding the ends, not the durations, keeps every scene
+    within half a frame of its audio however many come before it.
+    """
+    return int(round(start * fps)), int(round((start + duration) * fps))
+
+
+def render_frames(scenes, output_path, profile, audio_path=None, threads=None, ring=3, start=0.0):
+    """
+    Encodes scenes, a list of (image, duration, text), back to back into
+    output_path, one frame at a time. Peak memory does not depend on the
+    number of scenes or the reel length. start is the reel time of the first
+    scene when output_path is one segment of a longer reel.
+    Returns the number of frames written.
+    """
+    fps = profile.fps
+    pipe = FramePipe(encoder_command(output_path, profile, audio_path, threads), profile.size, ring=ring)
+    frames = 0
+    try:
+        for image, duration, text in scenes:
+            scene = SceneFrames(image, duration, text, profile.size, fps, profile.anchor)
+            first, last = frame_range(start, duration, fps)
+            for n in range(first, last):
+                buf = pipe.next_buffer()
+                scene.draw(n / fps - start, buf)
+                pipe.push(buf)
+                frames += 1
+                if pipe.error is not None:
+                    break
+            if pipe.error is not None:
+                break
+            start += duration
+    finally:
+        pipe.close()
+    return frames
@@ -0,0 +1,182 @@
+import os
+import io
+import time
+import random
+import threading
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from pipeline.limits import api_slot
+from pipeline.metrics import DOWNLOADED_BYTES, HTTP_RETRIES, annotate
+
+RETRY_STATUSES = (408, 425, 429, 500, 502, 503, 504)
+
+
+class HttpError(Exception):
+    """Raised when a download still fails after every retry."""
+
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+class HttpClient:
+    """
+    Pooled HTTP client for image downloads.
+
+    - one keep-alive Session with a connection pool sized for the concurrency
+    - at most max_concurrency requests in flight across every caller
+    - exponential backoff with jitter on connection errors, timeouts, 429 and 5xx
+      (Retry-After is honoured)
+    - optional hedging: if an attempt is slower than hedge_after seconds a
+      second identical request is raced against it and the first answer wins
+    - bodies are streamed into memory and can be decoded straight into Pillow
+    - every attempt also goes through the adaptive limiter of provider
+      (pipeline.limits), which 429s and 5xx shrink
+    """
+
+    def __init__(self, max_concurrency=4, timeout=30, connect_timeout=5, retries=3, backoff=0.5,
+                 backoff_max=8.0, hedge_after=None, chunk_size=64 * 1024, provider=None):
+        self.max_concurrency = max_concurrency
+        self.provider = provider
+        self.timeout = (connect_timeout, timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.hedge_after = hedge_after
+        self.chunk_size = chunk_size
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max_concurrency * 2, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._hedge_pool = ThreadPoolExecutor(max_workers=max_concurrency * 2, thread_name_prefix="reel-http")
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "retries": 0, "hedges": 0, "failures": 0, "bytes": 0}
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self.stats[name] += amount
+
+    def _attempt(self, url):
+        """One request under the provider's limiter; returns the body bytes or raises HttpError."""
+        # The fair queue comes first, so a busy job cannot hold every connection slot while it waits
+        with api_slot(self.provider):
+            return self._request(url)
+
+    def _request(self, url):
+        with self._slots:
+            self._count("requests")
+            try:
+                with self.session.get(url, timeout=self.timeout, stream=True) as resp:
+                    if resp.status_code != 200:
+                        error = HttpError(f"HTTP {resp.status_code}", status=resp.status_code)
+                        error.retry_after = resp.headers.get("Retry-After")
+                        raise error
+                    buf = io.BytesIO()
+                    for chunk in resp.iter_content(chunk_size=self.chunk_size):
+                        buf.write(chunk)
+            except requests.RequestException as e:
+                raise HttpError(str(e))
+        data = buf.getvalue()
+        self._count("bytes", len(data))
+        return data
+
+    def _hedged_attempt(self, url):
+        if not self.hedge_after:
+            return self._attempt(url)
+
+        # The limiter slot is taken here, in the caller's thread and job context, so calls
+        # are queued fairly by job; the pool only runs requests the limiter already let through
+        with api_slot(self.provider):
+            futures = [self._hedge_pool.submit(self._request, url)]
+            done, _ = wait(futures, timeout=self.hedge_after)
+            if not done:
+                self._count("hedges")
+                # The hedge runs under the slot this call already holds: waiting for a second
+                # one while holding the first deadlocks once the window is full
+                futures.append(self._hedge_pool.submit(self._request, url))
+
+            error = None
+            pending = set(futures)
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    try:
+                        return future.result()
+                    except HttpError as e:
+                        error = e
+            raise error
+
+    def _delay(self, attempt, error):
+        retry_after = getattr(error, "retry_after", None)
+        if retry_after:
+            try:
+                return min(float(retry_after), self.backoff_max)
+            except ValueError:
+                pass
+        delay = min(self.backoff * (2 ** attempt), self.backoff_max)
+        return delay * (0.5 + random.random() / 2)  # jitter
+
+    def get_bytes(self, url):
+        """Downloads url, retrying transient failures. Raises HttpError."""
+        host = urllib.parse.urlsplit(url).hostname
+        error = None
+        for attempt in range(self.retries + 1):
+            try:
+                data = self._hedged_attempt(url)
+                DOWNLOADED_BYTES.inc(len(data), host=host)
+                annotate(bytes=len(data))
+                return data
+            except HttpError as e:
+                error = e
+                if e.status is not None and e.status not in RETRY_STATUSES:
+                    break
+                if attempt < self.retries:
+                    self._count("retries")
+                    HTTP_RETRIES.inc(host=host)
+                    annotate(retries=1)
+                    time.sleep(self._delay(attempt, e))
+        self._count("failures")
+        raise error
+
+    def get_image(self, url):
+        """Downloads url and decodes it with Pillow. Returns (image, raw bytes)."""
+        from PIL import Image
+
+        data = self.get_bytes(url)
+        img = Image.open(io.BytesIO(data))
+        img.load()
+        return img, data
+
+    def close(self):
+        self._hedge_pool.shutdown(wait=False)
+        self.session.close()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_http_client():
+    """
+    Process-wide client, configured with REEL_HTTP_CONCURRENCY (4), REEL_HTTP_TIMEOUT (30s),
+    REEL_HTTP_RETRIES (3) and REEL_HTTP_HEDGE_AFTER (15s, 0 disables hedging).
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            hedge_after = float(os.environ.get("REEL_HTTP_HEDGE_AFTER", 15))
+            _client = HttpClient(
+                max_concurrency=int(os.environ.get("REEL_HTTP_CONCURRENCY", 4)),
+                timeout=float(os.environ.get("REEL_HTTP_TIMEOUT", 30)),
+                retries=int(os.environ.get("REEL_HTTP_RETRIES", 3)),
+                hedge_after=hedge_after or None,
+                provider="pollinations",
+            )
+        return _client
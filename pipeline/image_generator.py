@@ -1,143 +1,230 @@
 import os
-import requests
+import logging
 import urllib.parse
+from io import BytesIO
 from dotenv import load_dotenv
 
+from pipeline.cache import DiskCache, get_cache, seed_for
+from pipeline.coalesce import coalesce
+from pipeline.http_client import HttpError, get_http_client
+from pipeline.metrics import in_context, span
+
 load_dotenv()
 
-def generate_images(script_lines, background_prompt="cinematic background, high quality"):
+logger = logging.getLogger(__name__)
+
+IMAGE_SIZE = (1024, 1024)
+FG_ALPHA = 210  # ~82% foreground opacity (0-255)
+
+
+def build_image_url(prompt, seed, width=IMAGE_SIZE[0], height=IMAGE_SIZE[1]):
+    # POLLINATIONS_BASE_URL lets tests and benchmarks point at a local fake server
+    base_url = os.environ.get("POLLINATIONS_BASE_URL", "https://image.pollinations.ai").rstrip("/")
+    encoded_prompt = urllib.parse.quote(prompt)
+    return f"{base_url}/prompt/{encoded_prompt}?width={width}&height={height}&nologo=true&seed={seed}"
+
+
+def fetch_image(prompt, label="image", variant=0):
     """
-    Generates meaningful images using the free Pollinations.ai API.
-    Saves images to static/output/image_X.png.
-    Returns a tuple: (list of file paths, path to UI background).
+    Downloads a single Pollinations image and decodes it to an RGB uint8 array
+    of IMAGE_SIZE (resized only if the server sent another size).
+    Raw downloads are kept in the shared cache keyed by prompt, seed and size,
+    and concurrent fetches of the same image share one download.
+    Returns None if the request fails.
     """
-    output_dir = os.path.join("static", "output")
-    os.makedirs(output_dir, exist_ok=True)
-    
-    image_paths = []
-    # Default return if things fail
-    ui_bg_path = os.path.join(output_dir, "background_ui.png")
-
-    print(f"Generating images for {len(script_lines)} scenes with background theme: '{background_prompt}'...")
-    
-    from concurrent.futures import ThreadPoolExecutor, as_completed
+    cache = get_cache()
+    seed = seed_for(prompt, salt=variant)
+    key = DiskCache.make_key("image", prompt, seed, width=IMAGE_SIZE[0], height=IMAGE_SIZE[1])
+    url = build_image_url(prompt, seed)
+    try:
+        with span("image_fetch", label=label):
+            return coalesce("image", key, _load_image, cache, key, url)
+    except HttpError as e:
+        logger.warning(f"Failed to fetch {label}: {e}")
+        return None
+    except Exception as e:
+        logger.error(f"Error fetching {label}: {e}")
+        return None
+
+
+def _load_image(cache, key, url):
+    """Returns the image at url as an RGB array of IMAGE_SIZE, from the cache when possible."""
+    import numpy as np
+    from PIL import Image
+
+    content = cache.get(key) if cache else None
+    if content is None:
+        # Pooled, retrying, concurrency-limited download
+        img, content = get_http_client().get_image(url)
+        if cache:
+            cache.put(key, content)
+    else:
+        img = Image.open(BytesIO(content))
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    # Resize to ensure exact dimensions
+    if img.size != IMAGE_SIZE:
+        img = img.resize(IMAGE_SIZE, Image.Resampling.LANCZOS)
+    return np.asarray(img)
+
+
+def background_image_prompt(background_prompt):
+    return f"{background_prompt}, cinematic, 8k, no text"
+
+
+def scene_image_prompt(line):
+    return f"cinematic shot, 8k, hyper-realistic, dramatic lighting, {line}, movie scene"
+
+
+def merge_scene(bg, fg, alpha=FG_ALPHA):
+    """
+    Blends the scene (foreground) on top of the shared background.
+    Background fills the full frame; the foreground sits on top at ~82% opacity
+    so the scene stays the main focus while the theme shows through.
+    Both are RGB uint8 arrays; the blend is one vectorized integer lerp.
+    """
+    import numpy as np
+
+    if bg is None:
+        return fg
+    # out = (fg * a + bg * (255 - a)) / 255, rounded, in uint16
+    acc = np.multiply(fg, alpha, dtype=np.uint16)
+    acc += np.multiply(bg, 255 - alpha, dtype=np.uint16)
+    acc += 127
+    acc //= 255
+    return acc.astype(np.uint8)
+
+
+def fetch_background(background_prompt, variant=0):
+    """Downloads and decodes one variant of a job's shared background."""
+    return fetch_image(background_image_prompt(background_prompt), f"background {variant + 1}", variant)
+
+
+def fetch_backgrounds(background_prompt, variants=1):
+    """Downloads and decodes the shared background pool for one job, every variant at once."""
+    if variants <= 1:
+        return [fetch_background(background_prompt)]
+    from concurrent.futures import ThreadPoolExecutor
+
+    with ThreadPoolExecutor(max_workers=variants) as executor:
+        futures = [executor.submit(in_context(fetch_background), background_prompt, v) for v in range(variants)]
+        return [future.result() for future in futures]
+
+
+def background_variants(script_lines, bg_variants=None):
+    if bg_variants is None:
+        bg_variants = int(os.environ.get("REEL_BG_VARIANTS", 1))
+    return max(1, min(bg_variants, len(script_lines) or 1))
+
+
+def save_ui_background(bg, ui_bg_path):
+    """Saves the UI background from the decoded scene background (or a dark placeholder)."""
+    from PIL import Image
+
+    if bg is None:
+        img = Image.new('RGB', IMAGE_SIZE, color=(30, 30, 30))
+    else:
+        img = Image.fromarray(bg)
+    # Served to the browser, so a fast JPEG beats a lossless PNG
+    img.save(ui_bg_path, quality=90)
+    return ui_bg_path
+
+
+def fallback_scene_image(index, line):
+    """Plain coloured card with the scene text, used when the downloads fail."""
+    import numpy as np
     from PIL import Image, ImageDraw, ImageFont
 
-    def fetch_merged_image(index, line):
+    logger.info(f"Generating fallback image for scene {index+1}...")
+    # Basic colors fallback
+    colors = [(73, 109, 137), (137, 73, 109), (109, 137, 73)]
+    bg_color = colors[index % len(colors)]
+    img = Image.new('RGB', IMAGE_SIZE, color=bg_color)
+
+    d = ImageDraw.Draw(img)
+    try:
+        font = ImageFont.truetype("/System/Library/Fonts/Helvetica.ttc", 60)
+    except:
+        font = ImageFont.load_default()
+    d.text((50, 400), f"Scene {index+1}\n{line[:30]}...", fill=(255,255,255), font=font)
+    return np.asarray(img)
+
+
+def compose_scene(index, line, bg, fg):
+    """
+    Composites one scene onto its background, falling back to a plain card
+    if the foreground is missing. Returns an RGB uint8 array.
+    """
+    with span("compose", scene=index, fallback=fg is None):
         try:
-            filename = f"image_{index}.png"
-            filepath = os.path.join(output_dir, filename)
-            
-            # 1. Generate URLs
-            # Background
-            encoded_bg_prompt = urllib.parse.quote(f"{background_prompt}, cinematic, 8k, no text")
-            bg_seed = random.randint(0, 100000)
-            bg_url = f"https://image.pollinations.ai/prompt/{encoded_bg_prompt}?width=1024&height=1024&nologo=true&seed={bg_seed}"
-            
-            # Foreground (Scene)
-            fg_prompt = f"cinematic shot, 8k, hyper-realistic, dramatic lighting, {line}, movie scene"
-            encoded_fg_prompt = urllib.parse.quote(fg_prompt)
-            fg_seed = random.randint(0, 100000)
-            fg_url = f"https://image.pollinations.ai/prompt/{encoded_fg_prompt}?width=1024&height=1024&nologo=true&seed={fg_seed}"
-            
-            # 2. Download Images
-            print(f"Fetching images for scene {index+1}...")
-            bg_resp = requests.get(bg_url, timeout=30)
-            fg_resp = requests.get(fg_url, timeout=30)
-            
-            if bg_resp.status_code == 200 and fg_resp.status_code == 200:
-                # 3. Process & Merge
-                from io import BytesIO
-                bg_img = Image.open(BytesIO(bg_resp.content)).convert("RGBA")
-                fg_img = Image.open(BytesIO(fg_resp.content)).convert("RGBA")
-                
-                # Save first background for UI
-                if index == 0:
-                    bg_img.save(ui_bg_path)
-                
-                # Resize to ensure exact dimensions
-                bg_img = bg_img.resize((1024, 1024), Image.Resampling.LANCZOS)
-                fg_img = fg_img.resize((1024, 1024), Image.Resampling.LANCZOS)
-
-                # Blend: FG on top of BG
-                # We want the background to be visible but the foreground (scene) to be the main focus
-                # strategy: 
-                # 1. Background image full opacity
-                # 2. Foreground image with reduced opacity (e.g. 85%) overlaid?
-                # OR better: 
-                # 3. Use the foreground image as base, but blend it with the background?
-                # The user requirement: "Background should fill full frame. Foreground image should blend on top with slight transparency or soft edges"
-                
-                # Let's try blending them 70/30 or 80/20 favor of foreground, 
-                # but "foreground on top" suggests FG is the subject.
-                
-                # Approach: 
-                # Base layer = Background
-                # Top layer = Foreground with alpha 0.85
-                
-                fg_img.putalpha(210) # ~82% opacity (0-255)
-                merged = Image.alpha_composite(bg_img, fg_img)
-                
-                # Optional: Add a slight vignette to focus center?
-                # (Skipping for now to keep it simple but effective)
-
-                merged.save(filepath)
-                return (index, filepath)
-            else:
-                print(f"Failed to fetch images for scene {index}: BG={bg_resp.status_code}, FG={fg_resp.status_code}")
-                return None
+            if fg is not None:
+                return merge_scene(bg, fg)
         except Exception as e:
-            print(f"Error generating scene {index}: {e}")
-            return None
-
-    # Use ThreadPool
-    import random
-    with ThreadPoolExecutor(max_workers=2) as executor:
-        futures = {executor.submit(fetch_merged_image, i, line): i for i, line in enumerate(script_lines)}
-        
-        results = []
-        for future in as_completed(futures):
-            res = future.result()
-            if res:
-                results.append(res)
-    
-    results.sort(key=lambda x: x[0])
-    
-    image_paths_map = {r[0]: r[1] for r in results}
-    final_paths = []
-    
-    # Fallback handling
-    for i, line in enumerate(script_lines):
-        if i in image_paths_map:
-            final_paths.append(image_paths_map[i])
-        else:
-            print(f"Generating fallback image for scene {i+1}...")
-            filename = f"image_{i}.png"
-            filepath = os.path.join(output_dir, filename)
-            try:
-                # Basic colors fallback
-                colors = [(73, 109, 137), (137, 73, 109), (109, 137, 73)]
-                bg_color = colors[i % len(colors)]
-                img = Image.new('RGB', (1024, 1024), color=bg_color)
-                
-                # If we need a fallback UI BG
-                if i == 0 and not os.path.exists(ui_bg_path):
-                    img.save(ui_bg_path)
-
-                d = ImageDraw.Draw(img)
-                try:
-                    font = ImageFont.truetype("/System/Library/Fonts/Helvetica.ttc", 60)
-                except:
-                    font = ImageFont.load_default()
-                d.text((50, 400), f"Scene {i+1}\n{line[:30]}...", fill=(255,255,255), font=font)
-                img.save(filepath)
-                final_paths.append(filepath)
-            except Exception as e:
-                print(f"Fallback failed: {e}")
-
-    # Ensure UI background exists if everything failed
-    if not os.path.exists(ui_bg_path):
-        # Create a dummy one
-        Image.new('RGB', (1024, 1024), color=(30, 30, 30)).save(ui_bg_path)
-
-    return final_paths, ui_bg_path
+            logger.error(f"Error generating scene {index}: {e}")
+        return fallback_scene_image(index, line)
+
+
+def scene_image_format():
+    """File format for optional scene image dumps: REEL_SCENE_FORMAT=png (fast, level 1) or jpg."""
+    return os.environ.get("REEL_SCENE_FORMAT", "png").lower()
+
+
+def save_scene_image(image, output_dir, index):
+    """Writes a composed scene to <output_dir>/image_<index>.<fmt> and returns the path."""
+    from PIL import Image
+
+    fmt = scene_image_format()
+    if fmt in ("jpg", "jpeg"):
+        filepath = os.path.join(output_dir, f"image_{index}.jpg")
+        Image.fromarray(image).save(filepath, quality=92)
+    else:
+        filepath = os.path.join(output_dir, f"image_{index}.png")
+        Image.fromarray(image).save(filepath, compress_level=1)
+    return filepath
+
+
+def save_scene_images_enabled():
+    """Scene images are only written to disk when REEL_SAVE_SCENES=1; the renderer takes arrays."""
+    return os.environ.get("REEL_SAVE_SCENES", "0").lower() in ("1", "true", "yes", "on")
+
+
+def generate_images(script_lines, background_prompt="cinematic background, high quality", output_dir=None,
+                    bg_variants=None):
+    """
+    Generates meaningful images using the free Pollinations.ai API.
+    Saves images to <output_dir>/image_X.png (static/output by default).
+    Returns a tuple: (list of file paths, path to UI background).
+
+    The themed background is fetched once per job (or as a small pool of
+    bg_variants, REEL_BG_VARIANTS by default) and decoded once; only the
+    per-scene foregrounds are downloaded for every line.
+    """
+    if output_dir is None:
+        output_dir = os.path.join("static", "output")
+    os.makedirs(output_dir, exist_ok=True)
+    bg_variants = background_variants(script_lines, bg_variants)
+
+    ui_bg_path = os.path.join(output_dir, "background_ui.jpg")
+
+    logger.info(f"Generating images for {len(script_lines)} scenes with background theme: '{background_prompt}' "
+          f"({bg_variants} background variant(s))...")
+
+    from concurrent.futures import ThreadPoolExecutor
+
+    bg_prompt = background_image_prompt(background_prompt)
+
+    # The shared HTTP client caps requests in flight; match it so no thread just waits
+    with ThreadPoolExecutor(max_workers=get_http_client().max_concurrency) as executor:
+        # Phase 1: one background per job (or per variant), queued ahead of the scenes
+        bg_futures = [executor.submit(in_context(fetch_image), bg_prompt, f"background {v + 1}", v) for v in range(bg_variants)]
+        # Phase 2: only the foregrounds are fetched per scene
+        fg_futures = [executor.submit(in_context(fetch_image), scene_image_prompt(line), f"scene {i + 1}")
+                      for i, line in enumerate(script_lines)]
+
+        # Save the UI background from the same decoded image the scenes use
+        save_ui_background(bg_futures[0].result(), ui_bg_path)
+
+        scenes = [compose_scene(i, line, bg_futures[i % bg_variants].result(), fg_futures[i].result())
+                  for i, line in enumerate(script_lines)]
+
+    return [save_scene_image(image, output_dir, i) for i, image in enumerate(scenes)], ui_bg_path
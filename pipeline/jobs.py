@@ -0,0 +1,544 @@
+import os
+import logging
+import re
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from pipeline.artifacts import file_hash, get_artifact_store
+from pipeline.dag import DAG
+from pipeline.frame_renderer import frame_range
+from pipeline.metrics import JOBS_FINISHED, set_job, span
+from pipeline.profiles import final_profile, preview_profile
+from pipeline import scene_manifest
+from pipeline.script_writer import write_script_bundle
+from pipeline.streaming import HlsStream, streaming_enabled
+from pipeline.image_generator import (
+    background_variants, compose_scene, fetch_background, fetch_image, save_scene_image, save_scene_images_enabled,
+    save_ui_background, scene_image_prompt,
+)
+from pipeline.voiceover import generate_voiceover_with_timings
+from pipeline.video_maker import (
+    concat_segments, create_video, default_render_mode, finish_segment, segment_path, submit_segment,
+)
+
+logger = logging.getLogger(__name__)
+
+OUTPUT_ROOT = os.path.join("static", "output")
+JOB_DIR_RE = re.compile(r"^[0-9a-f]{32}$")  # Job ids are uuid4 hex
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class PipelineError(Exception):
+    """Raised when a pipeline stage produces no usable output."""
+
+    def __init__(self, stage, message):
+        super().__init__(message)
+        self.stage = stage
+
+
+class QueueFullError(Exception):
+    """Raised when too many jobs are already waiting for a worker."""
+
+
+STAGES = ("script", "images", "voiceover", "video")
+
+
+def run_reel(prompt, output_dir, on_stage=None, on_preview=None, on_stream=None, script=None, previous_dir=None):
+    """
+    Runs the full pipeline (script, images, voiceover, video) for one prompt.
+    Every artifact is written inside output_dir.
+
+    Stages run as a dependency graph: once the script is known, the background,
+    every foreground and the voiceover are fetched at the same time, and each
+    scene segment starts rendering as soon as its image and the audio are ready.
+
+    Unless REEL_PREVIEW_PROFILE=none, a fast low-resolution preview is rendered
+    ahead of the final video and handed to on_preview(path) as soon as it exists.
+
+    In segment mode (and unless REEL_STREAM=0) the scenes of the first render
+    are also published one by one to an HLS playlist, handed to on_stream(path)
+    as soon as the first scene is playable.
+
+    script, a (script lines, background prompt) pair, skips the LLM. With
+    previous_dir, the output of an earlier run, this is an edit: scenes whose
+    text, image inputs, audio and format match that run's scene manifest reuse
+    its segments, and only the changed scenes are fetched and rendered before
+    the reel is joined again. Segment runs write the manifest (scenes.json).
+
+    Returns a dict with script_lines, background_prompt, image_paths (only when
+    REEL_SAVE_SCENES=1), ui_bg_path, voiceover_path, timings, preview_path,
+    stream_path, video_path, reused_scenes, stage_seconds and critical_path.
+    """
+    reached = [-1]
+
+    def stage(name):
+        # Stages overlap, so only ever report forward progress
+        index = STAGES.index(name)
+        if index > reached[0]:
+            reached[0] = index
+            if on_stage:
+                on_stage(name)
+
+    os.makedirs(output_dir, exist_ok=True)
+    ui_bg_path = os.path.join(output_dir, "background_ui.jpg")
+    render_mode = default_render_mode()
+    final = final_profile()
+    preview = preview_profile()
+    previous = {}
+    if previous_dir:
+        # Edits only render what changed, which beats a full preview; segments make that possible
+        render_mode = "segments"
+        preview = None
+        previous = scene_manifest.reusable_scenes(scene_manifest.load_manifest(previous_dir), previous_dir)
+        if os.path.exists(os.path.join(previous_dir, "background_ui.jpg")):
+            scene_manifest.link_file(os.path.join(previous_dir, "background_ui.jpg"), ui_bg_path)
+    preview_path = os.path.join(output_dir, "preview_video.mp4")
+    # The first render to finish each scene feeds the stream
+    stream_profile = preview or final
+    stream = [None]
+    save_scenes = save_scene_images_enabled()
+    image_paths = {}
+    image_hashes = {}
+    scenes = {}
+    reused_scenes = []
+    dag = DAG(max_workers=int(os.environ.get("REEL_DAG_WORKERS", 16)))
+
+    def script_step():
+        stage("script")
+        if script is not None:
+            script_lines, bg_prompt = script
+        else:
+            logger.info(f"Generating script for: {prompt}")
+            # One LLM round trip returns both the script and the background theme
+            script_lines, bg_prompt = write_script_bundle(prompt)
+        if not script_lines:
+            raise PipelineError("script", "Failed to generate script.")
+        logger.info(f"Background Style: {bg_prompt}")
+        plan_scenes(script_lines, bg_prompt)
+        return script_lines, bg_prompt
+
+    def background(bundle, variant):
+        stage("images")
+        bg = fetch_background(bundle[1], variant)
+        if variant == 0 and not os.path.exists(ui_bg_path):
+            save_ui_background(bg, ui_bg_path)
+        return bg
+
+    def foreground(line):
+        stage("images")
+        return fetch_image(scene_image_prompt(line), "scene")
+
+    def image(index, line, bg, fg_img):
+        # Scenes stay decoded arrays all the way into the renderer
+        scene = compose_scene(index, line, bg, fg_img)
+        if save_scenes:
+            image_paths[index] = save_scene_image(scene, output_dir, index)
+        return scene
+
+    def voiceover(bundle):
+        stage("voiceover")
+        voiceover_path, timings = generate_voiceover_with_timings(bundle[0], output_dir=output_dir)
+        if not voiceover_path:
+            raise PipelineError("voiceover", "Failed to generate voiceover.")
+        if render_mode == "segments" and streaming_enabled():
+            stream[0] = HlsStream(os.path.join(output_dir, "stream"), voiceover_path, timings,
+                                  stream_profile.audio_bitrate, on_publish=on_stream)
+        return voiceover_path, timings
+
+    def publish_scene(index, path):
+        # Like the preview, the stream never fails the job
+        if stream[0] is not None and path:
+            try:
+                stream[0].add(index, path)
+            except Exception as e:
+                logger.warning(f"Streaming scene {index} failed: {e}")
+        return path
+
+    def scene_duration(voice, index):
+        # Each scene lasts exactly as long as its own line is spoken
+        timing = voice[1][index]
+        return timing["end"] - timing["start"]
+
+    def scene_start(voice, index):
+        # Segments count their frames on the reel clock, so joined they stay in step with the voice
+        return voice[1][index]["start"]
+
+    def scene_render_hash(index, line, voice):
+        first, last = frame_range(scene_start(voice, index), scene_duration(voice, index), final.fps)
+        return scene_manifest.render_hash(image_hashes[index], line, scene_duration(voice, index), last - first,
+                                          final)
+
+    def queue_preview(index, line, scene, voice):
+        stage("video")
+        return submit_segment(scene, scene_duration(voice, index), line,
+                              segment_path(output_dir, index, "preview_segment"), preview, scene_start(voice, index))
+
+    def record_scene(index, line, voice, path):
+        duration = scene_duration(voice, index)
+        scenes[index] = {
+            "text": line,
+            "text_hash": scene_manifest.text_hash(line),
+            "image_hash": image_hashes[index],
+            "audio_hash": voice[1][index].get("audio_hash"),
+            "duration": duration,
+            "render_hash": scene_render_hash(index, line, voice),
+            "segment": os.path.relpath(path, output_dir),
+            "segment_hash": file_hash(path),
+        }
+
+    def segment(index, line, scene, voice):
+        stage("video")
+        duration, start = scene_duration(voice, index), scene_start(voice, index)
+        path = finish_segment(submit_segment(scene, duration, line, segment_path(output_dir, index), final, start),
+                              index, duration, final, start)
+        if path:
+            record_scene(index, line, voice, path)
+        if not preview:
+            publish_scene(index, path)
+        return path
+
+    def reuse_segment(index, line, old, voice):
+        stage("video")
+        if (old["render_hash"] == scene_render_hash(index, line, voice)
+                and old["audio_hash"] == voice[1][index].get("audio_hash")
+                and file_hash(old["path"]) == old["segment_hash"]):
+            path = scene_manifest.link_file(old["path"], segment_path(output_dir, index))
+            record_scene(index, line, voice, path)
+            reused_scenes.append(index)
+            return publish_scene(index, path)
+        # The voice or the format came out different after all: build the scene and render it
+        logger.info(f"Scene {index} changed since the previous run, rendering it again")
+        script_lines, bg_prompt = dag.results["script"]
+        bg = fetch_background(bg_prompt, index % background_variants(script_lines))
+        scene = image(index, line, bg, foreground(line))
+        return segment(index, line, scene, voice)
+
+    def preview_step(fn, *args):
+        # The preview is a courtesy: if it fails the job still delivers the final video
+        if any(arg is None for arg in args):
+            return None
+        try:
+            return fn(*args)
+        except Exception as e:
+            logger.warning(f"Preview render failed: {e}")
+            return None
+
+    def publish_preview(voice, *paths):
+        path = preview_step(concat_segments, list(paths), voice[0], preview_path, preview) if all(paths) else None
+        if path and on_preview:
+            on_preview(path)
+        return path
+
+    def plan_scenes(script_lines, bg_prompt):
+        n = len(script_lines)
+        variants = background_variants(script_lines)
+        reused = {}
+        for i, line in enumerate(script_lines):
+            image_hashes[i] = scene_manifest.image_hash(bg_prompt, i % variants, line)
+            old = previous.get((scene_manifest.text_hash(line), image_hashes[i]))
+            if old is not None:
+                reused[i] = old
+
+        dag.add("voiceover", voiceover, ["script"])
+        # One node per background variant, so each scene waits only for its own
+        needed = {i % variants for i in range(n) if i not in reused}
+        if needed and not os.path.exists(ui_bg_path):
+            needed.add(0)  # the UI background
+        for v in sorted(needed):
+            dag.add(f"background_{v}", lambda bundle, v=v: background(bundle, v), ["script"])
+        for i, line in enumerate(script_lines):
+            if i in reused:
+                # Unchanged scene: nothing to download, its old segment is checked once the voice is known
+                continue
+            dag.add(f"foreground_{i}", lambda _, line=line: foreground(line), ["script"])
+            dag.add(f"image_{i}", lambda bg, fg, i=i, line=line: image(i, line, bg, fg),
+                    [f"background_{i % variants}", f"foreground_{i}"])
+
+        if render_mode == "segments":
+            # The render pool is FIFO: every preview segment is queued before any final
+            # one, so the preview is never stuck behind full-quality encodes
+            queued = [f"queue_preview_{i}" for i in range(n)] if preview else []
+            for i, line in enumerate(script_lines):
+                if preview:
+                    dag.add(f"queue_preview_{i}",
+                            lambda scene, voice, i=i, line=line: queue_preview(i, line, scene, voice),
+                            [f"image_{i}", "voiceover"])
+                    dag.add(f"preview_segment_{i}",
+                            lambda future, voice, i=i: publish_scene(i, preview_step(
+                                finish_segment, future, i, scene_duration(voice, i), preview, scene_start(voice, i))),
+                            [f"queue_preview_{i}", "voiceover"])
+                if i in reused:
+                    dag.add(f"segment_{i}", lambda voice, i=i, line=line: reuse_segment(i, line, reused[i], voice),
+                            ["voiceover"])
+                    continue
+                dag.add(f"segment_{i}", lambda scene, voice, *_, i=i, line=line: segment(i, line, scene, voice),
+                        [f"image_{i}", "voiceover"] + queued)
+            if preview:
+                dag.add("preview", publish_preview, ["voiceover"] + [f"preview_segment_{i}" for i in range(n)])
+            dag.add("video", lambda voice, *paths: concat_segments(list(paths), voice[0],
+                                                                    os.path.join(output_dir, "final_video.mp4"),
+                                                                    final),
+                    ["voiceover"] + [f"segment_{i}" for i in range(n)])
+        else:
+            def video(voice, *scenes):
+                stage("video")
+                scene_durations = [t["end"] - t["start"] for t in voice[1]]
+                if preview:
+                    # create_video logs its own failures and returns None
+                    path = create_video(list(scenes), voice[0], script_lines, output_dir=output_dir,
+                                        render_mode=render_mode, scene_durations=scene_durations,
+                                        profile=preview, output_name="preview_video.mp4")
+                    if path and on_preview:
+                        on_preview(path)
+                return create_video(list(scenes), voice[0], script_lines, output_dir=output_dir,
+                                    render_mode=render_mode, scene_durations=scene_durations, profile=final)
+            dag.add("video", video, ["voiceover"] + [f"image_{i}" for i in range(n)])
+
+    dag.add("script", script_step)
+    try:
+        results = dag.run()
+    except PipelineError:
+        raise
+    except Exception as e:
+        failed = [name for name in dag.timings if name not in dag.results]
+        raise PipelineError(failed[0].split("_")[0] if failed else "pipeline", str(e))
+
+    video_path = results["video"]
+    if not video_path:
+        raise PipelineError("video", "Failed to create video.")
+
+    script_lines, bg_prompt = results["script"]
+    if render_mode == "segments" and len(scenes) == len(script_lines):
+        scene_manifest.write_manifest(output_dir, prompt, bg_prompt, final,
+                                      [scenes[i] for i in range(len(script_lines))])
+    critical_path, critical_seconds = dag.critical_path()
+    logger.info(f"Critical path ({critical_seconds:.1f}s): {' -> '.join(critical_path)}")
+
+    return {
+        "script_lines": script_lines,
+        "background_prompt": bg_prompt,
+        "image_paths": [image_paths[i] for i in sorted(image_paths)],
+        "ui_bg_path": ui_bg_path,
+        "voiceover_path": results["voiceover"][0],
+        "preview_path": preview_path if os.path.exists(preview_path) else None,
+        "stream_path": stream[0].playlist_path if stream[0] is not None and stream[0].published else None,
+        "timings": results["voiceover"][1],
+        "video_path": video_path,
+        "reused_scenes": sorted(reused_scenes),
+        "stage_seconds": dag.durations(),
+        "critical_path": {"tasks": critical_path, "seconds": critical_seconds},
+    }
+
+
+class Job:
+    """State of a single reel request, shared between the web thread and a worker."""
+
+    def __init__(self, prompt, output_dir, script=None, parent=None):
+        self.id = uuid.uuid4().hex
+        self.prompt = prompt
+        self.output_dir = os.path.join(output_dir, self.id)
+        # Edits carry their script and the job they reuse scenes from
+        self.script = script
+        self.parent_id = parent.id if parent else None
+        self.previous_dir = parent.output_dir if parent else None
+        self.status = QUEUED
+        self.stage = None
+        self.error = None
+        self.result = None
+        self.preview_path = None
+        self.stream_path = None
+        # Artifact store names of the published media, by kind ("video", "preview", "ui_bg")
+        self.artifacts = {}
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "prompt": self.prompt,
+            "status": self.status,
+            "stage": self.stage,
+            "error": self.error,
+            "parent_id": self.parent_id,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class JobQueue:
+    """
+    Runs reel jobs on a bounded pool of worker threads.
+    submit() returns immediately; callers poll get() for progress.
+
+    Finished videos, previews and UI backgrounds are published to the artifact
+    store (unless REEL_ARTIFACTS=0). A job's working directory is removed once
+    the job is dropped from the registry. Directories of jobs this queue does
+    not know (from before a restart, or from another process sharing
+    output_root) are removed once untouched for max_dir_age seconds
+    (REEL_JOB_DIR_MAX_AGE, default one day), at start-up and after every job.
+    """
+
+    def __init__(self, max_workers=None, max_queued=None, output_root=OUTPUT_ROOT,
+                 max_history=200, runner=run_reel, store=None, max_dir_age=None):
+        if max_workers is None:
+            max_workers = int(os.environ.get("REEL_WORKERS", min(4, os.cpu_count() or 1)))
+        if max_queued is None:
+            max_queued = int(os.environ.get("REEL_MAX_QUEUED", 32))
+        if max_dir_age is None:
+            max_dir_age = int(os.environ.get("REEL_JOB_DIR_MAX_AGE", 24 * 3600))
+
+        self.max_workers = max_workers
+        self.max_queued = max_queued
+        self.output_root = output_root
+        self.max_history = max_history
+        self.runner = runner
+        self.store = store if store is not None else get_artifact_store()
+        self.max_dir_age = max_dir_age
+
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="reel-worker")
+        self.sweep_job_dirs()
+
+    def submit(self, prompt, script=None, parent=None):
+        """
+        Queues a reel. script and parent make it an edit of the parent job:
+        the given (lines, background prompt) are rendered reusing the parent's unchanged scenes.
+        """
+        with self._lock:
+            if self._count(QUEUED) >= self.max_queued:
+                raise QueueFullError("Too many reels are waiting. Please try again shortly.")
+            job = Job(prompt, self.output_root, script=script, parent=parent)
+            self._jobs[job.id] = job
+            forgotten = self._prune()
+            # An edit still to run links segments from its parent's directory; the sweep gets it later
+            in_use = {j.previous_dir for j in self._jobs.values() if j.status in (QUEUED, RUNNING)}
+
+        for old in forgotten:
+            if old.output_dir not in in_use:
+                shutil.rmtree(old.output_dir, ignore_errors=True)
+            if self.store is not None:
+                for name in old.artifacts.values():
+                    self.store.unpin(name)
+        self._executor.submit(self._run, job)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def counts(self):
+        with self._lock:
+            return {"queued": self._count(QUEUED), "running": self._count(RUNNING)}
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+    def _count(self, status):
+        return sum(1 for job in self._jobs.values() if job.status == status)
+
+    def _prune(self):
+        # Forget the oldest finished jobs so the registry does not grow forever
+        finished = [j for j in self._jobs.values() if j.status in (DONE, FAILED)]
+        excess = len(finished) - self.max_history
+        if excess <= 0:
+            return []
+        finished.sort(key=lambda j: j.finished_at)
+        for job in finished[:excess]:
+            del self._jobs[job.id]
+        return finished[:excess]
+
+    def _publish(self, job, kind, path):
+        # Best effort: without an artifact the job's own copy is served instead
+        if self.store is None or not path:
+            return
+        try:
+            # Pinned until the job is forgotten, so gc() never removes what the job serves
+            name = self.store.put(path, pin=True)
+        except OSError as e:
+            logger.warning(f"Could not store the {kind} of job {job.id}: {e}")
+            return
+        with self._lock:
+            old = job.artifacts.get(kind)
+            job.artifacts[kind] = name
+        if old is not None:
+            self.store.unpin(old)
+
+    def sweep_job_dirs(self):
+        """Removes directories under output_root of jobs not in the registry, once older than max_dir_age."""
+        with self._lock:
+            in_use = {os.path.basename(j.output_dir) for j in self._jobs.values()}
+            in_use |= {os.path.basename(j.previous_dir) for j in self._jobs.values() if j.previous_dir}
+        try:
+            entries = list(os.scandir(self.output_root))
+        except OSError:
+            return 0
+        removed = 0
+        now = time.time()
+        for entry in entries:
+            if not JOB_DIR_RE.match(entry.name) or entry.name in in_use:
+                continue
+            try:
+                if not entry.is_dir(follow_symlinks=False) or now - entry.stat().st_mtime < self.max_dir_age:
+                    continue
+            except OSError:
+                continue
+            shutil.rmtree(entry.path, ignore_errors=True)
+            removed += 1
+        if removed:
+            logger.info(f"Removed {removed} old job director{'y' if removed == 1 else 'ies'}")
+        return removed
+
+    def _collect_artifacts(self):
+        try:
+            self.store.gc()
+        except OSError as e:
+            logger.warning(f"Artifact store cleanup failed: {e}")
+
+    def _run(self, job):
+        job.status = RUNNING
+        job.started_at = time.time()
+        # Worker threads are reused; each job's spans carry its own id
+        token = set_job(job.id)
+
+        def on_stage(name):
+            job.stage = name
+
+        def on_preview(path):
+            self._publish(job, "preview", path)
+            job.preview_path = path
+
+        def on_stream(path):
+            job.stream_path = path
+
+        try:
+            with span("job"):
+                job.result = self.runner(job.prompt, job.output_dir, on_stage=on_stage, on_preview=on_preview,
+                                         on_stream=on_stream, script=job.script, previous_dir=job.previous_dir)
+            self._publish(job, "video", job.result["video_path"])
+            self._publish(job, "ui_bg", job.result["ui_bg_path"])
+            job.status = DONE
+        except PipelineError as e:
+            logger.error(f"Job {job.id} failed at {e.stage}: {e}")
+            job.error = str(e)
+            job.status = FAILED
+        except Exception as e:
+            logger.exception(f"Job {job.id} error: {e}")
+            job.error = str(e)
+            job.status = FAILED
+        finally:
+            job.finished_at = time.time()
+            JOBS_FINISHED.inc(status=job.status)
+            token.var.reset(token)
+            if self.store is not None:
+                self._collect_artifacts()
+            self.sweep_job_dirs()
@@ -0,0 +1,287 @@
+import asyncio
+import contextlib
+import os
+import random
+import threading
+import time
+from collections import OrderedDict, deque
+
+from pipeline.metrics import PROVIDER_THROTTLED, PROVIDER_WAIT, current_job, register_gauge
+
+OVERLOAD_STATUSES = (429, 500, 502, 503, 504)
+OVERLOAD_ERRORS = ("ResourceExhausted", "TooManyRequests", "ServiceUnavailable", "DeadlineExceeded",
+                   "InternalServerError", "Timeout", "ConnectTimeout", "ReadTimeout")
+
+# Per-provider defaults: requests/second (None: no bucket), burst, and the AIMD concurrency window
+PROVIDER_DEFAULTS = {
+    "gemini": {"rate": 2.0, "burst": 4, "initial": 2, "min": 1, "max": 4},
+    "pollinations": {"rate": None, "burst": 8, "initial": 4, "min": 1, "max": 8},
+    "gtts": {"rate": 5.0, "burst": 8, "initial": 4, "min": 1, "max": 8},
+}
+
+
+def is_overload(error):
+    """True when an exception means the provider is throttling or overloaded (429, 5xx, timeouts)."""
+    for attr in ("status", "code", "status_code"):
+        value = getattr(error, attr, None)
+        if isinstance(value, int) and value in OVERLOAD_STATUSES:
+            return True
+    for attr in ("rsp", "response"):  # gTTS / requests keep the HTTP response here
+        if getattr(getattr(error, attr, None), "status_code", None) in OVERLOAD_STATUSES:
+            return True
+    return any(cls.__name__ in OVERLOAD_ERRORS for cls in type(error).__mro__)
+
+
+class FileSlots:
+    """
+    Concurrency slots shared by every process on the host: slot i is an flock
+    on <directory>/<name>.<i>.lock, so a process that dies frees its slots.
+    """
+
+    def __init__(self, directory, name):
+        self.directory = directory
+        self.name = name
+        os.makedirs(directory, exist_ok=True)
+
+    def acquire(self, count):
+        """Blocks until one of the first count slots is free; returns its open lock file."""
+        import fcntl
+
+        delay = 0.01
+        while True:
+            for i in random.sample(range(count), count):
+                f = open(os.path.join(self.directory, f"{self.name}.{i}.lock"), "a")
+                try:
+                    fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    return f
+                except OSError:
+                    f.close()
+            time.sleep(delay * (0.5 + random.random()))
+            delay = min(delay * 2, 0.25)
+
+    @staticmethod
+    def release(f):
+        # Closing the file drops the flock
+        f.close()
+
+
+class AdaptiveLimiter:
+    """
+    Schedules the outbound calls of one provider.
+
+    - a token bucket caps the request rate (rate per second, up to burst at once)
+    - an AIMD window caps the calls in flight: +1 per window of successes,
+      halved when the provider answers 429/5xx (once per window: calls that
+      were already in flight when it shrank do not shrink it again)
+    - waiting callers are served round-robin by job, so one job with many
+      queued calls cannot starve the others
+    - with slots (FileSlots), the window is also enforced across processes
+    """
+
+    def __init__(self, name, rate=None, burst=8, initial=4, min_limit=1, max_limit=8, backoff=0.5,
+                 slots=None):
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.limit = float(max(min_limit, min(initial, max_limit)))
+        self.backoff = backoff
+        self.slots = slots
+        self.in_flight = 0
+        self._tokens = float(burst)
+        self._refilled = time.monotonic()
+        self._issued = 0  # sequence number of the last call let through
+        self._decreased = 0  # ... and of the last one in flight when the window shrank
+        self._queues = OrderedDict()  # job -> deque of waiting tickets
+        self._cond = threading.Condition()
+        self.stats = {"calls": 0, "throttled": 0, "decreases": 0, "waited_s": 0.0}
+
+    def _refill(self, now):
+        if self.rate:
+            self._tokens = min(self.burst, self._tokens + (now - self._refilled) * self.rate)
+        self._refilled = now
+
+    def _head(self):
+        for queue in self._queues.values():
+            return queue[0]
+        return None
+
+    def acquire(self, job=None):
+        """Waits for this job's turn, a free window slot and a token. Returns the handle to release."""
+        ticket = object()
+        start = time.monotonic()
+        with self._cond:
+            self._queues.setdefault(job, deque()).append(ticket)
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                wait = None
+                if self._head() is ticket and self.in_flight < int(self.limit):
+                    if not self.rate or self._tokens >= 1:
+                        break
+                    wait = (1 - self._tokens) / self.rate
+                self._cond.wait(wait)
+
+            if self.rate:
+                self._tokens -= 1
+            self.in_flight += 1
+            self._issued += 1
+            seq = self._issued
+            queue = self._queues.pop(job)
+            queue.popleft()
+            if queue:
+                # Round robin: this job's next call goes behind every other waiting job
+                self._queues[job] = queue
+            self._cond.notify_all()
+            limit = int(self.limit)
+
+        lock = self.slots.acquire(limit) if self.slots is not None else None
+        waited = time.monotonic() - start
+        with self._cond:
+            self.stats["calls"] += 1
+            self.stats["waited_s"] += waited
+        PROVIDER_WAIT.observe(waited, provider=self.name)
+        return seq, lock
+
+    def release(self, handle, overloaded=False):
+        seq, lock = handle
+        if lock is not None:
+            self.slots.release(lock)
+        with self._cond:
+            self.in_flight -= 1
+            if overloaded:
+                self.stats["throttled"] += 1
+                # One decrease per window of failures, not one per failed call in flight
+                if seq > self._decreased:
+                    self.limit = max(self.min_limit, self.limit * self.backoff)
+                    self._decreased = self._issued
+                    self.stats["decreases"] += 1
+            else:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self._cond.notify_all()
+        if overloaded:
+            PROVIDER_THROTTLED.inc(provider=self.name)
+
+    @contextlib.contextmanager
+    def slot(self, job=None):
+        handle = self.acquire(job)
+        overloaded = False
+        try:
+            yield
+        except Exception as e:
+            overloaded = is_overload(e)
+            raise
+        finally:
+            self.release(handle, overloaded)
+
+    def snapshot(self):
+        with self._cond:
+            return dict(self.stats, limit=round(self.limit, 2), in_flight=self.in_flight,
+                        waiting=sum(len(q) for q in self._queues.values()))
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+_api_slots = None
+
+
+def limiter_from_env(provider):
+    """
+    Builds the limiter for a provider from PROVIDER_DEFAULTS and REEL_LIMIT_<PROVIDER>_RATE,
+    _BURST, _INITIAL, _MIN and _MAX (RATE=0 disables the token bucket). With REEL_LIMIT_DIR
+    set, the concurrency window is shared by every process using that directory.
+    """
+    defaults = PROVIDER_DEFAULTS.get(provider, PROVIDER_DEFAULTS["pollinations"])
+    prefix = f"REEL_LIMIT_{provider.upper()}_"
+
+    def setting(key, cast):
+        value = os.environ.get(prefix + key.upper())
+        return cast(value) if value is not None else defaults[key]
+
+    shared_dir = os.environ.get("REEL_LIMIT_DIR")
+    return AdaptiveLimiter(
+        provider,
+        rate=setting("rate", float) or None,
+        burst=setting("burst", int),
+        initial=setting("initial", int),
+        min_limit=setting("min", int),
+        max_limit=setting("max", int),
+        slots=FileSlots(shared_dir, provider) if shared_dir else None,
+    )
+
+
+def get_limiter(provider):
+    """Process-wide limiter for a provider ("gemini", "pollinations", "gtts")."""
+    with _limiters_lock:
+        if provider not in _limiters:
+            _limiters[provider] = limiter_from_env(provider)
+        return _limiters[provider]
+
+
+def limits_enabled():
+    return os.environ.get("REEL_LIMITS", "1").lower() not in ("0", "false", "no", "off")
+
+
+def set_api_slots(semaphore):
+    """
+    Makes every outbound API call in this process (LLM, TTS, image downloads)
+    also hold a slot of semaphore while it runs. Passing a multiprocessing semaphore
+    to every worker process of a batch caps the calls in flight across all of
+    them. None removes the limit.
+    """
+    global _api_slots
+    _api_slots = semaphore
+
+
+def _provider_limiter(provider):
+    # Offline stub backends pass no provider and are never throttled
+    return get_limiter(provider) if provider and limits_enabled() else None
+
+
+@contextlib.contextmanager
+def api_slot(provider):
+    """
+    Runs one outbound call to provider under its adaptive limiter (unless
+    REEL_LIMITS=0), queued fairly against the calls of other jobs. An
+    exception that signals throttling shrinks the provider's window.
+    """
+    limiter = _provider_limiter(provider)
+    with limiter.slot(current_job()) if limiter else contextlib.nullcontext():
+        with _api_slots if _api_slots is not None else contextlib.nullcontext():
+            yield
+
+
+@contextlib.asynccontextmanager
+async def api_slot_async(provider):
+    """api_slot for coroutines: the wait for a slot happens off the event loop."""
+    limiter = _provider_limiter(provider)
+    slots = _api_slots
+    handle = await asyncio.to_thread(limiter.acquire, current_job()) if limiter else None
+    overloaded = False
+    try:
+        if slots is not None:
+            await asyncio.to_thread(slots.acquire)
+        try:
+            yield
+        finally:
+            if slots is not None:
+                slots.release()
+    except Exception as e:
+        overloaded = is_overload(e)
+        raise
+    finally:
+        if limiter:
+            limiter.release(handle, overloaded)
+
+
+def _limiter_samples(key):
+    with _limiters_lock:
+        limiters = list(_limiters.values())
+    return [({"provider": limiter.name}, limiter.snapshot()[key]) for limiter in limiters]
+
+
+register_gauge("reel_provider_concurrency_limit", "Current AIMD window of outbound calls per provider.",
+               lambda: _limiter_samples("limit"))
+register_gauge("reel_provider_in_flight", "Outbound calls in flight per provider.",
+               lambda: _limiter_samples("in_flight"))
@@ -0,0 +1,246 @@
+import bisect
+import contextvars
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger("reel.trace")
+
+# Latency buckets (seconds) covering a 50ms cache hit up to a multi-minute render
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class Counter:
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self.kind = "counter"
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(_label_key(labels), 0)
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, key, (), value) for key, value in self._values.items()]
+
+
+class Gauge(Counter):
+    """Gauge whose value is set directly or read from a callback at scrape time."""
+
+    def __init__(self, name, help_text, callback=None):
+        super().__init__(name, help_text)
+        self.kind = "gauge"
+        self.callback = callback
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[_label_key(labels)] = value
+
+    def samples(self):
+        if self.callback:
+            # callback returns (labels dict, value) pairs
+            return [(self.name, _label_key(labels), (), value) for labels, value in self.callback()]
+        return super().samples()
+
+
+class Histogram:
+    def __init__(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.kind = "histogram"
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                series["counts"][index] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def samples(self):
+        out = []
+        with self._lock:
+            for key, series in self._series.items():
+                cumulative = 0
+                for bound, count in zip(self.buckets, series["counts"]):
+                    cumulative += count
+                    out.append((f"{self.name}_bucket", key, (("le", f"{bound:g}"),), cumulative))
+                out.append((f"{self.name}_bucket", key, (("le", "+Inf"),), series["count"]))
+                out.append((f"{self.name}_sum", key, (), series["sum"]))
+                out.append((f"{self.name}_count", key, (), series["count"]))
+        return out
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def render(self):
+        """Prometheus text exposition format (0.0.4)."""
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, key, extra, value in metric.samples():
+                lines.append(f"{name}{_format_labels(key, extra)} {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "reel_stage_duration_seconds", "Duration of pipeline stages and per-scene steps."))
+DOWNLOADED_BYTES = REGISTRY.register(Counter(
+    "reel_downloaded_bytes_total", "Bytes downloaded from providers."))
+HTTP_RETRIES = REGISTRY.register(Counter(
+    "reel_http_retries_total", "Download attempts retried after a transient failure."))
+CACHE_LOOKUPS = REGISTRY.register(Counter(
+    "reel_cache_lookups_total", "Artifact cache lookups by stage and result."))
+RENDER_FPS = REGISTRY.register(Histogram(
+    "reel_render_fps", "Frames encoded per wall-clock second, per rendered segment.",
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500)))
+JOBS_FINISHED = REGISTRY.register(Counter(
+    "reel_jobs_finished_total", "Finished jobs by final status."))
+PROVIDER_WAIT = REGISTRY.register(Histogram(
+    "reel_provider_wait_seconds", "Time outbound calls waited for a provider slot.",
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)))
+PROVIDER_THROTTLED = REGISTRY.register(Counter(
+    "reel_provider_throttled_total", "Provider calls that came back throttled or overloaded."))
+COALESCED_CALLS = REGISTRY.register(Counter(
+    "reel_coalesced_calls_total", "Script, image and TTS calls served by an identical call already in flight."))
+
+
+def register_gauge(name, help_text, callback):
+    """callback() returns an iterable of (labels dict, value) pairs, read at scrape time."""
+    return REGISTRY.register(Gauge(name, help_text, callback=callback))
+
+
+def render_prometheus():
+    return REGISTRY.render()
+
+
+# --- Tracing ---
+
+_current_span = contextvars.ContextVar("reel_span", default=None)
+_current_job = contextvars.ContextVar("reel_job", default=None)
+
+
+def set_job(job_id):
+    """Tags every span started in this context with job_id."""
+    return _current_job.set(job_id)
+
+
+def current_job():
+    return _current_job.get()
+
+
+class Span:
+    def __init__(self, name, parent, attrs):
+        self.name = name
+        self.parent = parent
+        self.attrs = attrs
+        self.start = time.perf_counter()
+        self.duration = None
+
+    def add(self, key, amount=1):
+        self.attrs[key] = self.attrs.get(key, 0) + amount
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+
+def _log_span(name, duration, parent, attrs, error=None):
+    STAGE_SECONDS.observe(duration, stage=name)
+    fields = {"span": name, "job": _current_job.get(), "parent": parent,
+              "duration_ms": round(duration * 1000, 1)}
+    fields.update(attrs)
+    if error is not None:
+        fields["error"] = type(error).__name__
+    message = " ".join(f"{key}={value}" for key, value in fields.items() if value is not None)
+    logger.info(message, extra={"span": fields})
+
+
+@contextmanager
+def span(name, **attrs):
+    """
+    Times a stage (or one scene of a stage). Attributes can be attached with
+    annotate() from anywhere below it. On exit the span is logged as
+    key=value pairs on the "reel.trace" logger and fed into the stage histogram.
+    """
+    parent = _current_span.get()
+    current = Span(name, parent, dict(attrs))
+    token = _current_span.set(current)
+    error = None
+    try:
+        yield current
+    except Exception as e:
+        error = e
+        raise
+    finally:
+        _current_span.reset(token)
+        current.duration = time.perf_counter() - current.start
+        _log_span(name, current.duration, parent.name if parent else None, current.attrs, error)
+
+
+def record_span(name, duration, **attrs):
+    """Logs a span for work timed elsewhere (e.g. inside a render process)."""
+    parent = _current_span.get()
+    _log_span(name, duration, parent.name if parent else None, attrs)
+
+
+def in_context(fn):
+    """
+    Wraps fn to run in a copy of the caller's context, so spans and the job id
+    follow work handed to a thread pool. Call once per submitted task.
+    """
+    ctx = contextvars.copy_context()
+    return lambda *args, **kwargs: ctx.run(fn, *args, **kwargs)
+
+
+def annotate(**attrs):
+    """Adds numeric attributes to the innermost open span (bools/strings are set, numbers summed)."""
+    current = _current_span.get()
+    if current is None:
+        return
+    for key, value in attrs.items():
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            current.add(key, value)
+        else:
+            current.attrs[key] = value
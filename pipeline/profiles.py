@@ -0,0 +1,87 @@
+import os
+import copy
+
+# Where the zoom is pinned, as a fraction of the free space on each axis.
+# (0, 0) matches the old vfx.Resize + CompositeVideoClip path, which
+# placed the growing clip at the top-left corner. Kept here rather than in
+# pipeline.motion so choosing a profile does not import NumPy and Pillow.
+ANCHOR_TOP_LEFT = (0.0, 0.0)
+ANCHOR_CENTER = (0.5, 0.5)
+
+
+def frame_size(aspect, height):
+    """(width, height) for an aspect ratio like "9:16", rounded to even pixels for yuv420p."""
+    w, h = (int(part) for part in aspect.split(":"))
+    width = round(height * w / h / 2) * 2
+    return width, round(height / 2) * 2
+
+
+class RenderProfile:
+    """
+    Output format and encoder settings for one render.
+    Plain attributes only, so profiles can be sent to the segment worker processes.
+    """
+
+    def __init__(self, name, aspect="9:16", height=1920, fps=24, preset="medium", crf=23, threads=None,
+                 audio_bitrate="128k", pixel_format="yuv420p", anchor=ANCHOR_CENTER):
+        self.name = name
+        self.aspect = aspect
+        self.size = frame_size(aspect, height)
+        self.fps = fps
+        self.preset = preset
+        self.crf = crf
+        self.threads = threads  # None: split the cores between the render workers
+        self.audio_bitrate = audio_bitrate
+        self.pixel_format = pixel_format
+        self.anchor = anchor
+
+    def replace(self, size=None, fps=None):
+        """Copy with an explicit frame size and/or frame rate."""
+        profile = copy.copy(self)
+        if size is not None:
+            profile.size = tuple(size)
+        if fps is not None:
+            profile.fps = fps
+        return profile
+
+    def ffmpeg_params(self):
+        return ["-crf", str(self.crf)]
+
+    def __repr__(self):
+        return f"RenderProfile({self.name!r}, {self.size[0]}x{self.size[1]}@{self.fps}, {self.preset}, crf={self.crf})"
+
+
+PROFILES = {
+    # Comes back in seconds: a ninth of the pixels, half the frames, fastest x264 preset
+    "preview": RenderProfile("preview", aspect="9:16", height=640, fps=12, preset="ultrafast", crf=30,
+                             audio_bitrate="64k"),
+    # Full-quality 1080x1920 reel
+    "final": RenderProfile("final", aspect="9:16", height=1920, fps=24, preset="medium", crf=20,
+                           audio_bitrate="160k"),
+    # The original square output, top-left zoom included
+    "square": RenderProfile("square", aspect="1:1", height=1024, fps=24, preset="medium", crf=23,
+                            anchor=ANCHOR_TOP_LEFT),
+}
+
+
+def get_profile(name):
+    try:
+        return PROFILES[name]
+    except KeyError:
+        raise ValueError(f"Unknown render profile: {name} (expected one of {', '.join(PROFILES)})")
+
+
+def final_profile():
+    """Profile of the reel a job returns (REEL_FINAL_PROFILE, default "final")."""
+    return get_profile(os.environ.get("REEL_FINAL_PROFILE", "final"))
+
+
+def preview_profile():
+    """
+    Profile rendered before the final one (REEL_PREVIEW_PROFILE, default "preview"),
+    or None when previews are turned off with REEL_PREVIEW_PROFILE=none.
+    """
+    name = os.environ.get("REEL_PREVIEW_PROFILE", "preview")
+    if name.lower() in ("", "0", "none", "off"):
+        return None
+    return get_profile(name)
@@ -0,0 +1,79 @@
+import hashlib
+import json
+import os
+import shutil
+
+from pipeline.image_generator import FG_ALPHA, IMAGE_SIZE, background_image_prompt, scene_image_prompt
+
+MANIFEST_NAME = "scenes.json"
+VERSION = 1
+
+
+def inputs_hash(*parts):
+    payload = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def text_hash(line):
+    return hashlib.sha256(line.encode("utf-8")).hexdigest()
+
+
+def image_hash(background_prompt, variant, line):
+    """Everything the composed scene image is made from, known before any download."""
+    return inputs_hash(background_image_prompt(background_prompt), variant, scene_image_prompt(line),
+                       IMAGE_SIZE, FG_ALPHA)
+
+
+def render_hash(image, line, duration, frames, profile):
+    """Inputs of one rendered segment: its image, caption, length (seconds and frames) and output format."""
+    return inputs_hash(image, line, round(duration, 3), frames, vars(profile))
+
+
+def load_manifest(output_dir):
+    """Returns the scene manifest written by a previous run in output_dir, or None."""
+    try:
+        with open(os.path.join(output_dir, MANIFEST_NAME)) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return manifest if manifest.get("version") == VERSION else None
+
+
+def write_manifest(output_dir, prompt, background_prompt, profile, scenes):
+    manifest = {
+        "version": VERSION,
+        "prompt": prompt,
+        "background_prompt": background_prompt,
+        "profile": profile.name,
+        "scenes": scenes,
+    }
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, path)
+    return path
+
+
+def reusable_scenes(manifest, output_dir):
+    """
+    Scenes of a previous run keyed by (text hash, image hash), with their
+    segment path resolved against output_dir. Scenes whose segment is gone are left out.
+    """
+    scenes = {}
+    for scene in (manifest or {}).get("scenes", []):
+        path = os.path.join(output_dir, scene["segment"])
+        if os.path.exists(path):
+            scenes[(scene["text_hash"], scene["image_hash"])] = dict(scene, path=path)
+    return scenes
+
+
+def link_file(src, dst):
+    """Hard-links src to dst (copies across filesystems), replacing dst."""
+    if os.path.exists(dst):
+        os.remove(dst)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+    return dst
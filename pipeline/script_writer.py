@@ -1,10 +1,24 @@
 import os
-import google.generativeai as genai
+import re
+import json
+import time
+import logging
+import asyncio
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 
+from pipeline.cache import DiskCache, get_cache
+from pipeline.coalesce import coalesce
+from pipeline.limits import api_slot, api_slot_async
+from pipeline.metrics import annotate
+
 # Load env variables if not already loaded
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 def get_mock_script(topic):
     return [
         f"Here is a fascinating fact about {topic}.",
@@ -14,62 +28,217 @@ def get_mock_script(topic):
         "Follow for more amazing insights!"
     ]
 
-def write_script(topic):
-    """
-    Generates a 4-6 line script for a reel based on the topic using Google Gemini.
-    Returns a list of strings.
-    """
-    api_key = os.environ.get("GEMINI_API_KEY")
-    if not api_key:
-        print("Warning: Missing GEMINI_API_KEY. Using mock script.")
-        return get_mock_script(topic)
+def get_default_background(topic):
+    return f"cinematic background representing {topic}, high quality, 8k"
+
+MODEL_NAME = 'gemini-flash-latest'
+
+
+# Scenes per reel; longer scripts are cut
+MAX_SCRIPT_LINES = 6
+
+
+def build_prompt(topic):
+    return (
+        f"Write a detailed, informative Instagram Reel script about '{topic}'. "
+        "Provide exactly 5 distinct sections. Each section must be a short paragraph (2-3 sentences) "
+        "that provides deep insight or detail. "
+        "Also write a short, vivid, visual description for a background image representing the topic, "
+        "suitable for a cinematic video background "
+        "(examples: 'futuristic city with neon lights', 'peaceful zen garden with cherry blossoms'), max 15 words. "
+        'Respond with JSON only: {"script": ["section 1", "..."], "background": "description"}. '
+        "No numbering inside the sections."
+    )
+
+
+class GeminiBackend:
+    """Gemini client, configured once and reused for every request in the process."""
+
+    provider = "gemini"
+
+    def __init__(self, api_key, model_name=MODEL_NAME):
+        import google.generativeai as genai
 
-    try:
         genai.configure(api_key=api_key)
-        model = genai.GenerativeModel('gemini-flash-latest')
-        
-        prompt = (
-            f"Write a detailed, informative Instagram Reel script about '{topic}'. "
-            "Provide exactly 5 distinct sections. Each section must be a short paragraph (2-3 sentences) "
-            "that provides deep insight or detail. "
-            "Return only the text for each section, one per line. No numbering, no extra text."
+        self.model = genai.GenerativeModel(
+            model_name,
+            generation_config={"response_mime_type": "application/json"},
         )
 
-        response = model.generate_content(prompt)
-        content = response.text.strip()
-        lines = [line.strip() for line in content.split('\n') if line.strip()]
-        return lines[:6] # Ensure max 6 lines
+    def complete(self, prompt):
+        return self.model.generate_content(prompt).text
 
-    except Exception as e:
-        print(f"Error in script_writer (Gemini): {e}")
-        print("Falling back to mock script due to API error.")
-        return get_mock_script(topic)
+    async def complete_async(self, prompt):
+        response = await self.model.generate_content_async(prompt)
+        return response.text
 
-def generate_background_prompt(topic):
+
+class StubBackend:
     """
-    Generates a descriptive background prompt based on the topic.
-    Returns a single string.
+    Offline stand-in for Gemini: returns a well-formed JSON bundle of `lines`
+    sections for the topic after an optional simulated latency
+    (REEL_LLM_STUB_LATENCY seconds, REEL_LLM_STUB_LINES sections).
+    """
+
+    provider = None
+
+    def __init__(self, latency=0.0, lines=5):
+        self.latency = latency
+        self.lines = lines
+        self.calls = 0
+
+    def complete(self, prompt):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return self._respond(prompt)
+
+    async def complete_async(self, prompt):
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self._respond(prompt)
+
+    def _respond(self, prompt):
+        match = re.search(r"about '(.*?)'\.", prompt)
+        topic = match.group(1) if match else "this topic"
+        tag = hashlib.sha1(topic.encode("utf-8")).hexdigest()[:6]
+        script = [f"Part {i + 1} about {topic}: a short insight ({tag})." for i in range(self.lines)]
+        return json.dumps({"script": script, "background": f"cinematic scene evoking {topic}"})
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    """
+    Returns the process-wide LLM backend (REEL_LLM_BACKEND=gemini|stub),
+    or None when Gemini is selected but GEMINI_API_KEY is missing.
+    """
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            name = os.environ.get("REEL_LLM_BACKEND", "gemini").lower()
+            if name == "stub":
+                _backend = StubBackend(latency=float(os.environ.get("REEL_LLM_STUB_LATENCY", 0)),
+                                       lines=int(os.environ.get("REEL_LLM_STUB_LINES", 5)))
+            else:
+                api_key = os.environ.get("GEMINI_API_KEY")
+                if not api_key:
+                    return None
+                _backend = GeminiBackend(api_key)
+        return _backend
+
+
+def parse_bundle(text, topic):
+    """Parses the JSON response into (script_lines, background_prompt)."""
+    text = text.strip()
+    # Tolerate a fenced ```json block
+    if text.startswith("```"):
+        text = text.strip("`")
+        text = text[text.find("{"):]
+    data = json.loads(text)
+    lines = [str(line).strip() for line in data.get("script", []) if str(line).strip()]
+    background = str(data.get("background", "")).strip() or get_default_background(topic)
+    if not lines:
+        raise ValueError("response has no script lines")
+    return lines[:MAX_SCRIPT_LINES], background
+
+
+def normalize_topic(topic):
+    """Collapses whitespace, so prompts that differ only in spacing share the cache and in-flight calls."""
+    return " ".join(topic.split())
+
+
+def _bundle_key(topic):
+    return DiskCache.make_key("script_bundle", topic, model=MODEL_NAME)
+
+
+def write_script_bundle(topic):
     """
-    api_key = os.environ.get("GEMINI_API_KEY")
-    default_bg = f"cinematic background representing {topic}, high quality, 8k"
-    
-    if not api_key:
-        return default_bg
+    Generates the reel script and the background prompt with one LLM call.
+    Returns (list of script lines, background prompt string).
+    Concurrent requests for the same topic share one call.
+    """
+    topic = normalize_topic(topic)
+    backend = get_backend()
+    if backend is None:
+        logger.warning("Missing GEMINI_API_KEY. Using mock script.")
+        return get_mock_script(topic), get_default_background(topic)
+
+    lines, background = coalesce("script", _bundle_key(topic), _generate_bundle, backend, topic)
+    return list(lines), background
+
+
+def _generate_bundle(backend, topic):
+    cache = get_cache()
+    key = _bundle_key(topic)
+    cached = cache.get_json(key) if cache else None
+    if cached:
+        return cached[0], cached[1]
 
     try:
-        genai.configure(api_key=api_key)
-        model = genai.GenerativeModel('gemini-flash-latest')
-        
-        prompt = (
-            f"Write a short, vivid, visual description for a background image representing the topic '{topic}'. "
-            "It should be suitable for a cinematic video background. "
-            "Examples: 'futuristic city with neon lights', 'peaceful zen garden with cherry blossoms'. "
-            "Return only the description, max 15 words."
-        )
+        annotate(llm_calls=1)
+        with api_slot(backend.provider):
+            response = backend.complete(build_prompt(topic))
+        lines, background = parse_bundle(response, topic)
+        if cache:
+            cache.put_json(key, [lines, background])
+        return lines, background
 
-        response = model.generate_content(prompt)
-        return response.text.strip()
+    except Exception as e:
+        logger.error(f"Error in script_writer (Gemini): {e}")
+        logger.warning("Falling back to mock script due to API error.")
+        return get_mock_script(topic), get_default_background(topic)
 
+
+async def write_script_bundle_async(topic):
+    """Async variant of write_script_bundle, for scripting many topics on one event loop."""
+    topic = normalize_topic(topic)
+    backend = get_backend()
+    if backend is None:
+        return get_mock_script(topic), get_default_background(topic)
+
+    cache = get_cache()
+    key = _bundle_key(topic)
+    cached = cache.get_json(key) if cache else None
+    if cached:
+        return cached[0], cached[1]
+
+    try:
+        async with api_slot_async(backend.provider):
+            response = await backend.complete_async(build_prompt(topic))
+        lines, background = parse_bundle(response, topic)
+        if cache:
+            cache.put_json(key, [lines, background])
+        return lines, background
     except Exception as e:
-        print(f"Error in generate_background_prompt: {e}")
-        return default_bg
+        logger.error(f"Error in script_writer (Gemini async): {e}")
+        return get_mock_script(topic), get_default_background(topic)
+
+
+def write_script_bundles(topics, max_workers=8):
+    """
+    Scripts many topics concurrently on the shared client.
+    Returns a list of (script_lines, background_prompt) in the same order as topics.
+    """
+    if not topics:
+        return []
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(topics))) as executor:
+        return list(executor.map(write_script_bundle, topics))
+
+
+def write_script(topic):
+    """
+    Generates a 4-6 line script for a reel based on the topic using Google Gemini.
+    Returns a list of strings.
+    """
+    return write_script_bundle(topic)[0]
+
+def generate_background_prompt(topic):
+    """
+    Generates a descriptive background prompt based on the topic.
+    Returns a single string.
+    """
+    return write_script_bundle(topic)[1]
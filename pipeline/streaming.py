@@ -0,0 +1,97 @@
+import math
+import os
+import logging
+import subprocess
+import threading
+
+logger = logging.getLogger(__name__)
+
+PLAYLIST_NAME = "stream.m3u8"
+
+
+def streaming_enabled():
+    return os.environ.get("REEL_STREAM", "1").lower() not in ("0", "false", "no", "off")
+
+
+class HlsStream:
+    """
+    HLS playlist that grows while the scenes of a reel are rendered.
+
+    Scene segments may finish in any order; each one is remuxed (video
+    stream-copied, its slice of the voiceover encoded to AAC) into an MPEG-TS
+    file as soon as every scene before it is ready, and the playlist is
+    rewritten to list it. The playlist is an EVENT playlist until the last
+    scene is in, then it is closed with EXT-X-ENDLIST.
+    """
+
+    def __init__(self, stream_dir, audio_path, timings, audio_bitrate="128k", on_publish=None):
+        self.stream_dir = stream_dir
+        self.audio_path = audio_path
+        self.timings = timings
+        self.audio_bitrate = audio_bitrate
+        self.on_publish = on_publish
+        self.playlist_path = os.path.join(stream_dir, PLAYLIST_NAME)
+        self.published = 0
+        self._ready = {}
+        self._lock = threading.Lock()
+        os.makedirs(stream_dir, exist_ok=True)
+
+    @property
+    def complete(self):
+        return self.published == len(self.timings)
+
+    def add(self, index, segment_path):
+        """Registers the encoded segment for scene index and publishes every scene now in order."""
+        with self._lock:
+            self._ready[index] = segment_path
+            published = self.published
+            while self.published in self._ready:
+                self._mux(self.published, self._ready.pop(self.published))
+                self.published += 1
+            if self.published == published:
+                return
+            self._write_playlist()
+        if self.on_publish:
+            self.on_publish(self.playlist_path)
+
+    def _chunk_name(self, index):
+        return f"scene_{index}.ts"
+
+    def _mux(self, index, segment_path):
+        from moviepy.config import FFMPEG_BINARY
+
+        timing = self.timings[index]
+        start = timing["start"]
+        duration = timing["end"] - start
+        cmd = [
+            FFMPEG_BINARY, "-y", "-loglevel", "error",
+            "-i", segment_path,
+            "-ss", f"{start:.3f}", "-t", f"{duration:.3f}", "-i", self.audio_path,
+            "-map", "0:v", "-map", "1:a",
+            "-c:v", "copy", "-c:a", "aac", "-b:a", self.audio_bitrate,
+            # Chunks carry their position in the reel, so the player sees one continuous timeline
+            "-output_ts_offset", f"{start:.3f}",
+            "-f", "mpegts", os.path.join(self.stream_dir, self._chunk_name(index)),
+        ]
+        subprocess.run(cmd, check=True, capture_output=True)
+
+    def _write_playlist(self):
+        durations = [t["end"] - t["start"] for t in self.timings]
+        lines = [
+            "#EXTM3U",
+            "#EXT-X-VERSION:3",
+            f"#EXT-X-TARGETDURATION:{max(1, math.ceil(max(durations)))}",
+            "#EXT-X-MEDIA-SEQUENCE:0",
+            "#EXT-X-PLAYLIST-TYPE:EVENT",
+        ]
+        for index in range(self.published):
+            lines.append(f"#EXTINF:{durations[index]:.3f},")
+            lines.append(self._chunk_name(index))
+        if self.complete:
+            lines.append("#EXT-X-ENDLIST")
+
+        # Players poll the playlist; never let them read a half-written one
+        tmp_path = self.playlist_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, self.playlist_path)
@@ -0,0 +1,166 @@
+import os
+from functools import lru_cache
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+# Tried in order; the first one that exists is used for every caption
+FONT_PATHS = (
+    "/System/Library/Fonts/Helvetica.ttc",
+    "/Library/Fonts/Arial.ttf",
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+)
+
+MIN_FONTSIZE = 20  # Don't go below 20px
+BOTTOM_MARGIN = 100  # Caption sits 100px from the bottom
+
+# Scratch surface used only for measuring text
+_measure = ImageDraw.Draw(Image.new("RGBA", (1, 1)))
+
+
+@lru_cache(maxsize=1)
+def font_path():
+    for path in FONT_PATHS:
+        if os.path.exists(path):
+            return path
+    return None
+
+
+@lru_cache(maxsize=64)
+def load_font(size):
+    """Returns a cached FreeTypeFont for size (falls back to Pillow's default font)."""
+    path = font_path()
+    if path:
+        try:
+            return ImageFont.truetype(path, size)
+        except Exception:
+            pass
+    try:
+        return ImageFont.load_default(size)
+    except TypeError:
+        # Pillow < 10.1 has no scalable default font
+        return ImageFont.load_default()
+
+
+def wrap_text(text, font, max_width):
+    """Greedy word wrap using real glyph advances instead of a per-char estimate."""
+    space = font.getlength(" ")
+    lines = []
+    current = []
+    current_width = 0.0
+
+    for word in text.split():
+        word_width = font.getlength(word)
+
+        # Break words that can never fit on a line by themselves
+        while word_width > max_width and len(word) > 1:
+            cut = len(word) - 1
+            while cut > 1 and font.getlength(word[:cut]) > max_width:
+                cut -= 1
+            if current:
+                lines.append(" ".join(current))
+                current, current_width = [], 0.0
+            lines.append(word[:cut])
+            word = word[cut:]
+            word_width = font.getlength(word)
+
+        needed = word_width if not current else current_width + space + word_width
+        if current and needed > max_width:
+            lines.append(" ".join(current))
+            current, current_width = [word], word_width
+        else:
+            current.append(word)
+            current_width = needed
+
+    if current:
+        lines.append(" ".join(current))
+    return "\n".join(lines)
+
+
+def measure(wrapped_text, font, stroke_width=0):
+    bbox = _measure.multiline_textbbox((0, 0), wrapped_text, font=font, stroke_width=stroke_width, align="center")
+    return bbox[2] - bbox[0], bbox[3] - bbox[1]
+
+
+def fit_text(text, max_width, max_height, fontsize, stroke_width=0, min_fontsize=MIN_FONTSIZE):
+    """
+    Finds the largest font size <= fontsize whose wrapped text fits the box.
+    Binary search: fitting is monotonic in font size.
+    Returns (font, wrapped_text).
+    """
+    def attempt(size):
+        font = load_font(size)
+        wrapped = wrap_text(text, font, max_width)
+        width, height = measure(wrapped, font, stroke_width)
+        return font, wrapped, width <= max_width and height <= max_height
+
+    best = attempt(fontsize)
+    if best[2]:
+        return best[0], best[1]
+
+    lo, hi = min_fontsize, fontsize - 1
+    best = attempt(min_fontsize)
+    while lo <= hi:
+        mid = (lo + hi) // 2
+        result = attempt(mid)
+        if result[2]:
+            best = result
+            lo = mid + 1
+        else:
+            hi = mid - 1
+    return best[0], best[1]
+
+
+def draw_caption(text, size=(1024, 1024), fontsize=50, color="white", stroke_width=2, stroke_color="black",
+                 bottom_margin=BOTTOM_MARGIN):
+    """Draws the caption into a new full-frame RGBA array, bottom centred."""
+    # Target constraints
+    max_width = size[0] * 0.9  # 90% of screen width
+    max_height = size[1] * 0.4  # Max 40% of screen height
+
+    font, wrapped_text = fit_text(text, max_width, max_height, fontsize, stroke_width)
+
+    img = Image.new("RGBA", size, (0, 0, 0, 0))
+    draw = ImageDraw.Draw(img)
+
+    # Draw text at bottom center
+    text_width, text_height = measure(wrapped_text, font)
+    x = (size[0] - text_width) // 2
+    y = size[1] - text_height - bottom_margin
+
+    draw.multiline_text((x, y), wrapped_text, font=font, fill=color, align="center",
+                        stroke_width=stroke_width, stroke_fill=stroke_color)
+
+    return np.array(img)
+
+
+@lru_cache(maxsize=128)
+def caption_sprite(text, size=(1024, 1024), fontsize=50, color="white", stroke_width=2, stroke_color="black",
+                   bottom_margin=BOTTOM_MARGIN):
+    """
+    The caption cropped to the bounding box of its visible pixels.
+    Returns (x, y, read-only RGBA array) with x, y its position in the frame;
+    a fraction of the memory of the full-frame overlay, so cheap to cache.
+    """
+    frame = draw_caption(text, size, fontsize, color, stroke_width, stroke_color, bottom_margin)
+    alpha = frame[..., 3]
+    rows = np.flatnonzero(alpha.any(axis=1))
+    cols = np.flatnonzero(alpha.any(axis=0))
+    if not rows.size:
+        return 0, 0, np.zeros((0, 0, 4), dtype=np.uint8)
+    sprite = np.array(frame[rows[0]:rows[-1] + 1, cols[0]:cols[-1] + 1])
+    sprite.flags.writeable = False
+    return int(cols[0]), int(rows[0]), sprite
+
+
+def render_caption(text, size=(1024, 1024), fontsize=50, color="white", stroke_width=2, stroke_color="black",
+                   bottom_margin=BOTTOM_MARGIN):
+    """
+    The caption as a full-frame RGBA array, bottom centred. Built from the
+    memoized caption_sprite, so only the cropped sprite stays in memory.
+    """
+    x, y, sprite = caption_sprite(text, size, fontsize, color, stroke_width, stroke_color, bottom_margin)
+    frame = np.zeros((size[1], size[0], 4), dtype=np.uint8)
+    h, w = sprite.shape[:2]
+    frame[y:y + h, x:x + w] = sprite
+    return frame
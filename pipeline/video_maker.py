@@ -1,162 +1,282 @@
 import os
 import random
-import numpy as np
-from moviepy import *
-from PIL import Image, ImageDraw, ImageFont
+import logging
+import subprocess
+import threading
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 
-def create_text_clip_pil(text, size=(1024, 1024), fontsize=50, color='white', stroke_width=2):
+from pipeline.metrics import RENDER_FPS, record_span, span
+from pipeline.profiles import ANCHOR_TOP_LEFT, final_profile
+
+# MoviePy, NumPy, Pillow and the renderers are imported by the functions that
+# use them, so importing this module (and the web app) stays cheap
+
+logger = logging.getLogger(__name__)
+
+def create_text_clip_pil(text, size=(1024, 1024), fontsize=50, color='white', stroke_width=2,
+                         bottom_margin=None):
     """
     Creates a transparent ImageClip with text using Pillow.
     Dynamically scales font size to ensure text fits within width.
+    Layout and rendering are cached in pipeline.text_layout.
     """
-    # Create transparent image
-    img = Image.new('RGBA', size, (0, 0, 0, 0))
-    draw = ImageDraw.Draw(img)
-    
-    # Load Font
-    def load_font(size):
-        try:
-            # Try common macOS fonts
-            font_path = "/System/Library/Fonts/Helvetica.ttc"
-            if not os.path.exists(font_path):
-                font_path = "/Library/Fonts/Arial.ttf"
-            return ImageFont.truetype(font_path, size)
-        except Exception:
-            return ImageFont.load_default()
-
-    # Target constraints
-    max_width = size[0] * 0.9  # 90% of screen width (approx 920px)
-    max_height = size[1] * 0.4 # Max 40% of screen height
-    
-    current_fontsize = fontsize
-    font = load_font(current_fontsize)
-    
-    # Text wrapping (Smart)
-    import textwrap
-    
-    # Iteratively reduce font size and adjust wrap width until it fits
-    # Initial wrap estimate: 900px / (size/2) -> approx chars
-    # We loop to find the best fit
-    
-    wrapped_text = ""
-    
-    while current_fontsize > 20: # Don't go below 20px
-        font = load_font(current_fontsize)
-        
-        # Estimate chars per line based on current font size
-        # increased safety factor from 0.6 to 0.8 to assume wider chars check
-        avg_char_width = current_fontsize * 0.8 
-        wrap_width = int(max_width / avg_char_width)
-        
-        wrapper = textwrap.TextWrapper(width=wrap_width, break_long_words=True)
-        lines = wrapper.wrap(text)
-        wrapped_text = "\n".join(lines)
-        
-        # Check size
-        bbox = draw.multiline_textbbox((0, 0), wrapped_text, font=font)
-        text_width = bbox[2] - bbox[0]
-        text_height = bbox[3] - bbox[1]
-        
-        print(f"DEBUG: Font:{current_fontsize}px | Wrap:{wrap_width} chars | Width:{text_width}px / {max_width}px")
-        
-        if text_width <= max_width and text_height <= max_height:
-            break
-            
-        # Reduce font size and try again
-        current_fontsize -= 4 # Decrease faster
+    from moviepy import ImageClip
+    from pipeline.text_layout import BOTTOM_MARGIN, render_caption
 
-        
-    # Draw text at bottom center
-    bbox = draw.multiline_textbbox((0, 0), wrapped_text, font=font)
-    text_width = bbox[2] - bbox[0]
-    text_height = bbox[3] - bbox[1]
-    
-    x = (size[0] - text_width) // 2
-    y = size[1] - text_height - 100  # 100px from bottom
-    
-    # Draw stroke (simulated by drawing multiple times)
-    if stroke_width > 0:
-        stroke_color = 'black'
-        for dx in range(-stroke_width, stroke_width + 1):
-            for dy in range(-stroke_width, stroke_width + 1):
-                draw.multiline_text((x + dx, y + dy), wrapped_text, font=font, fill=stroke_color, align="center")
-
-    # Draw main text
-    draw.multiline_text((x, y), wrapped_text, font=font, fill=color, align="center")
-    
-    # Convert to numpy array for MoviePy
-    return ImageClip(np.array(img))
+    if bottom_margin is None:
+        bottom_margin = BOTTOM_MARGIN
+    return ImageClip(render_caption(text, tuple(size), fontsize, color, stroke_width, bottom_margin=bottom_margin))
+
+
+FPS = 24
+FRAME_SIZE = (1024, 1024)
 
-def create_video(image_paths, audio_path, script_lines=None):
+RENDER_MODES = ("compose", "segments", "pipe")
+
+
+def default_render_mode():
+    return os.environ.get("REEL_RENDER_MODE", "segments")
+
+
+def build_scene_clip(image, duration, text=None, fps=FPS, size=FRAME_SIZE, anchor=ANCHOR_TOP_LEFT):
+    """
+    Builds one scene: the image with a slow zoom (Ken Burns) and crossfade,
+    plus the caption overlay if text is given.
+    image may be a file path or a decoded RGB array.
+    """
+    from moviepy import CompositeVideoClip, ImageClip, VideoClip, vfx
+    from pipeline.frame_renderer import CAPTION_FADE, CAPTION_START, FADE_IN, caption_style
+    from pipeline.motion import KenBurns
+    from pipeline.text_layout import caption_sprite
+
+    # --- Motion Effect (Ken Burns) ---
+    # Trajectory is precomputed; frames are NumPy crops of a pre-scaled source
+    motion = KenBurns(image, duration, fps=fps, size=size, anchor=anchor)
+    img_clip = VideoClip(motion.frame_at, duration=duration)
+
+    # CrossFade
+    img_clip = img_clip.with_effects([vfx.CrossFadeIn(FADE_IN)])
+
+    # --- Text Overlay ---
+    layers = [img_clip]
+    if text:
+        # The caption's bounding box at its position, so only those pixels are composited
+        fontsize, stroke_width, bottom_margin = caption_style(size)
+        x, y, sprite = caption_sprite(text, tuple(size), fontsize, "white", stroke_width, "black", bottom_margin)
+        if sprite.size:
+            layers.append(ImageClip(sprite)
+                          .with_position((x, y))
+                          .with_duration(duration)
+                          .with_start(CAPTION_START)
+                          .with_effects([vfx.CrossFadeIn(CAPTION_FADE)]))
+
+    # Composite
+    video_segment = CompositeVideoClip(layers, size=size)
+    return video_segment.with_duration(duration)
+
+
+def render_segment(task):
+    """
+    Encodes a single scene (no audio) to its own MP4 through the frame pipe.
+    Runs inside a worker process, so it takes one picklable tuple.
+    Returns (path, encode seconds measured inside the worker).
+    """
+    from pipeline.frame_renderer import render_frames
+
+    image, duration, text, path, threads, profile, start = task
+    started = time.perf_counter()
+    render_frames([(image, duration, text)], path, profile, threads=threads, start=start)
+    return path, time.perf_counter() - started
+
+
+def finish_segment(future, index, duration, profile=None, start=0.0):
+    """
+    Waits for a submitted segment and records its render span and frames per
+    second. Returns the segment path.
+    """
+    from pipeline.frame_renderer import frame_range
+
+    profile = profile or final_profile()
+    path, seconds = future.result()
+    first, last = frame_range(start, duration, profile.fps)
+    frames = last - first
+    record_span("segment", seconds, scene=index, frames=frames, profile=profile.name)
+    if seconds > 0:
+        RENDER_FPS.observe(frames / seconds, profile=profile.name)
+    return path
+
+
+def concat_segments(segment_paths, audio_path, output_path, profile=None):
+    """
+    Joins already-encoded segments without re-encoding (ffmpeg concat demuxer)
+    and muxes the voiceover in once.
+    """
+    from moviepy.config import FFMPEG_BINARY
+
+    profile = profile or final_profile()
+    # One list per output, so a preview and a final can be joined side by side
+    list_path = os.path.splitext(output_path)[0] + "_segments.txt"
+    with open(list_path, "w") as f:
+        for path in segment_paths:
+            f.write(f"file '{os.path.abspath(path)}'\n")
+
+    cmd = [
+        FFMPEG_BINARY, "-y", "-loglevel", "error",
+        "-f", "concat", "-safe", "0", "-i", list_path,
+        "-i", audio_path,
+        "-map", "0:v", "-map", "1:a",
+        "-c:v", "copy", "-c:a", "aac", "-b:a", profile.audio_bitrate,
+        "-movflags", "+faststart",
+        output_path,
+    ]
+    with span("concat", segments=len(segment_paths)):
+        subprocess.run(cmd, check=True, capture_output=True)
+    return output_path
+
+
+def render_workers():
+    """Number of segment-render processes (REEL_RENDER_WORKERS, default one per core)."""
+    return max(1, int(os.environ.get("REEL_RENDER_WORKERS", os.cpu_count() or 1)))
+
+
+_segment_pool = None
+_segment_pool_lock = threading.Lock()
+
+
+def get_segment_pool():
+    """
+    Returns the process pool used for segment rendering, shared by all jobs so
+    worker start-up (importing moviepy, loading fonts) is only paid once.
+    """
+    from pipeline.warmup import warm_worker
+
+    global _segment_pool
+    with _segment_pool_lock:
+        if _segment_pool is None:
+            # spawn: the app runs jobs on threads, and forking a threaded process is unsafe
+            _segment_pool = ProcessPoolExecutor(max_workers=render_workers(),
+                                                mp_context=multiprocessing.get_context("spawn"),
+                                                initializer=warm_worker)
+        return _segment_pool
+
+
+def segment_path(output_dir, index, prefix="segment"):
+    segment_dir = os.path.join(output_dir, "segments")
+    os.makedirs(segment_dir, exist_ok=True)
+    return os.path.join(segment_dir, f"{prefix}_{index}.mp4")
+
+
+def submit_segment(image, duration, text, path, profile=None, start=0.0):
+    """
+    Queues one scene on the shared render pool; returns a Future for (path, seconds).
+    start is the scene's place on the reel clock, which sets its frame count.
+    """
+    profile = profile or final_profile()
+    # Split the cores between the concurrent x264 encoders instead of oversubscribing
+    threads = profile.threads or max(1, (os.cpu_count() or 1) // render_workers())
+    return get_segment_pool().submit(render_segment, (image, duration, text, path, threads, profile, start))
+
+
+def render_segments(image_paths, audio_path, script_lines, durations, output_dir, output_path, profile):
+    """
+    Renders every scene in parallel on a process pool, then stream-copies the
+    segments into output_path and adds the audio track.
+    """
+    logger.info(f"Rendering {len(image_paths)} segments on {render_workers()} worker process(es)...")
+    prefix = "segment" if profile.name == "final" else f"{profile.name}_segment"
+    futures = []
+    starts = [sum(durations[:i]) for i in range(len(durations))]
+    for i, img_path in enumerate(image_paths):
+        text = script_lines[i] if script_lines and i < len(script_lines) else None
+        futures.append(submit_segment(img_path, durations[i], text, segment_path(output_dir, i, prefix), profile,
+                                      starts[i]))
+    segment_paths = [finish_segment(future, i, durations[i], profile, starts[i]) for i, future in enumerate(futures)]
+
+    return concat_segments(segment_paths, audio_path, output_path, profile)
+
+
+def create_video(image_paths, audio_path, script_lines=None, output_dir=None, render_mode=None,
+                 scene_durations=None, size=None, fps=None, profile=None, output_name="final_video.mp4"):
     """
     Combines images, audio, and text into a final video with reliable transitions.
-    Returns path to static/output/final_video.mp4.
+    image_paths may hold file paths or already-decoded RGB arrays.
+    Returns path to <output_dir>/<output_name> (static/output/final_video.mp4 by default).
+
+    render_mode (REEL_RENDER_MODE by default):
+      "segments" - encode each scene in its own process and stream-copy them together
+      "pipe"     - draw the reel frame by frame straight into one ffmpeg process
+                   (flat memory, one core for drawing)
+      "compose"  - encode the whole reel in one MoviePy pass; frames come from one
+                   clip that blends only the scene transition windows
+
+    scene_durations (seconds per scene, e.g. from the voiceover timing manifest)
+    replaces the even split of the audio across scenes.
+
+    profile (a RenderProfile, REEL_FINAL_PROFILE by default) sets the frame size,
+    frame rate and encoder settings; size and fps override the profile's.
     """
-    output_dir = os.path.join("static", "output")
-    output_path = os.path.join(output_dir, "final_video.mp4")
-    
-    print("Creating cinematic video with text and music...")
+    from moviepy import AudioFileClip, VideoClip
+    from pipeline.frame_renderer import ReelFrames, render_frames
+
+    if output_dir is None:
+        output_dir = os.path.join("static", "output")
+    output_path = os.path.join(output_dir, output_name)
+    profile = (profile or final_profile()).replace(size=size, fps=fps)
+    if render_mode is None:
+        render_mode = default_render_mode()
+    if render_mode not in RENDER_MODES:
+        raise ValueError(f"Unknown render mode: {render_mode}")
+
+    logger.info(f"Creating cinematic video with text and music ({render_mode} mode, {profile})...")
     
     try:
-        # Load voiceover
-        voice_clip = AudioFileClip(audio_path)
-        total_duration = voice_clip.duration
+        with span("video", mode=render_mode, profile=profile.name, scenes=len(image_paths)):
+            # Load voiceover
+            voice_clip = AudioFileClip(audio_path)
+            total_duration = voice_clip.duration
         
-        # Calculate duration per image
-        if not image_paths:
-            raise ValueError("No images provided")
-            
-        duration_per_image = total_duration / len(image_paths)
-        
-        clips = []
-        for i, img_path in enumerate(image_paths):
-            # --- Motion Effect (Ken Burns) ---
-            # Helper for zoom
-            def zoom_effect(t):
-                return 1 + 0.04 * t  # Zoom speed
-
-            img_clip = ImageClip(img_path).with_duration(duration_per_image)
-            
-            # Apply Resize (Zoom) -> CrossFade
-            img_clip = (
-                img_clip
-                .with_effects([
-                    vfx.Resize(zoom_effect), 
-                    vfx.CrossFadeIn(1.0)
-                ])
-            )
+            # Calculate duration per image
+            if not image_paths:
+                raise ValueError("No images provided")
             
-            # --- Text Overlay ---
-            if script_lines and i < len(script_lines):
-                text_content = script_lines[i]
-                
-                # Use robust PIL generator
-                txt_clip = (create_text_clip_pil(text_content, size=(1024, 1024))
-                            .with_duration(duration_per_image)
-                            .with_start(0.5)
-                            .with_effects([vfx.CrossFadeIn(0.5)]))
-                
-                # Composite
-                video_segment = CompositeVideoClip([img_clip, txt_clip], size=(1024, 1024))
+            if scene_durations and len(scene_durations) == len(image_paths):
+                durations = list(scene_durations)
             else:
-                video_segment = CompositeVideoClip([img_clip], size=(1024, 1024))
-                
-            video_segment = video_segment.with_duration(duration_per_image)
-            clips.append(video_segment)
-            
-        # Concatenate all segments
-        final_video = concatenate_videoclips(clips, method="compose")
-        
-        # --- Audio ---
-        final_video = final_video.with_audio(voice_clip)
+                duration_per_image = total_duration / len(image_paths)
+                durations = [duration_per_image] * len(image_paths)
+
+            if render_mode == "segments":
+                voice_clip.close()
+                return render_segments(image_paths, audio_path, script_lines, durations, output_dir, output_path,
+                                       profile)
+
+            scenes = [(img, durations[i], script_lines[i] if script_lines and i < len(script_lines) else None)
+                      for i, img in enumerate(image_paths)]
+            if render_mode == "pipe":
+                voice_clip.close()
+                render_frames(scenes, output_path, profile, audio_path=audio_path)
+                return output_path
+
+            # One clip for the whole reel instead of concatenate_videoclips(method="compose"),
+            # which sends every frame through the general compositor
+            reel = ReelFrames(scenes, profile.size, profile.fps, profile.anchor)
+            final_video = VideoClip(reel.frame_at, duration=reel.duration)
         
-        # Write file
-        final_video.write_videofile(output_path, fps=24, codec='libx264', audio_codec='aac')
+            # --- Audio ---
+            final_video = final_video.with_audio(voice_clip)
         
-        return output_path
+            # Write file
+            final_video.write_videofile(output_path, fps=profile.fps, codec='libx264', audio_codec='aac',
+                                        audio_bitrate=profile.audio_bitrate, preset=profile.preset,
+                                        ffmpeg_params=profile.ffmpeg_params() + ["-movflags", "+faststart"],
+                                        pixel_format=profile.pixel_format, threads=profile.threads,
+                                        temp_audiofile_path=output_dir, logger=None)
+            logger.info(f"Wrote {output_path} ({reel.duration:.1f}s): composed {reel.counts['transition']} "
+                        f"transition and {reel.counts['steady']} steady frames")
         
+            return output_path
     except Exception as e:
-        print(f"Error creating video: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception(f"Error creating video: {e}")
         return None
@@ -1,23 +1,204 @@
 import os
-from gtts import gTTS
+import io
+import hashlib
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
-def generate_voiceover(script_lines):
+from pipeline.cache import DiskCache, get_cache
+from pipeline.coalesce import coalesce
+from pipeline.limits import api_slot
+from pipeline.metrics import in_context, span
+
+logger = logging.getLogger(__name__)
+
+# --- MP3 frame parsing (enough to measure and join Layer III streams) ---
+
+_BITRATES_V1 = (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320)
+_BITRATES_V2 = (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160)
+_SAMPLE_RATES = {3: (44100, 48000, 32000), 2: (22050, 24000, 16000), 0: (11025, 12000, 8000)}
+
+
+def _skip_id3(data):
+    if data[:3] == b"ID3" and len(data) >= 10:
+        size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+        return 10 + size
+    return 0
+
+
+def iter_mp3_frames(data):
     """
-    Combines script lines into one text and generates MP3 using gTTS.
-    Saves to static/output/voice.mp3.
-    Returns path to the audio file.
+    Yields (offset, length, duration_seconds) for every MPEG Layer III audio frame.
+    ID3 tags and Xing/Info/VBRI header frames are skipped.
+    """
+    pos = _skip_id3(data)
+    first = True
+    while pos + 4 <= len(data):
+        b1, b2, b3 = data[pos + 1], data[pos + 2], data[pos + 3]
+        version = (b1 >> 3) & 3
+        layer = (b1 >> 1) & 3
+        bitrate_index = b2 >> 4
+        rate_index = (b2 >> 2) & 3
+        if (data[pos] != 0xFF or (b1 & 0xE0) != 0xE0 or version == 1 or layer != 1
+                or bitrate_index in (0, 15) or rate_index == 3):
+            pos += 1  # Not a frame header: resync
+            continue
+
+        mpeg1 = version == 3
+        bitrate = (_BITRATES_V1 if mpeg1 else _BITRATES_V2)[bitrate_index] * 1000
+        sample_rate = _SAMPLE_RATES[version][rate_index]
+        padding = (b2 >> 1) & 1
+        length = (144 if mpeg1 else 72) * bitrate // sample_rate + padding
+        samples = 1152 if mpeg1 else 576
+
+        if first:
+            first = False
+            mono = (b3 >> 6) == 3
+            side_info = (17 if mono else 32) if mpeg1 else (9 if mono else 17)
+            tag = data[pos + 4 + side_info:pos + 8 + side_info]
+            if tag in (b"Xing", b"Info") or data[pos + 36:pos + 40] == b"VBRI":
+                pos += length
+                continue
+
+        yield pos, length, samples / sample_rate
+        pos += length
+
+
+def mp3_duration(data):
+    return sum(duration for _, _, duration in iter_mp3_frames(data))
+
+
+def mp3_audio_frames(data):
+    """Returns only the audio frames, so several MP3s can be joined byte-wise."""
+    return b"".join(data[offset:offset + length] for offset, length, _ in iter_mp3_frames(data))
+
+
+# --- TTS backends ---
+
+class GTTSBackend:
+    """Google Translate TTS via gTTS."""
+
+    provider = "gtts"
+
+    def __init__(self, lang='en'):
+        self.lang = lang
+
+    def synthesize(self, text):
+        from gtts import gTTS
+
+        buf = io.BytesIO()
+        gTTS(text=text, lang=self.lang).write_to_fp(buf)
+        return buf.getvalue()
+
+
+class StubTTSBackend:
+    """
+    Offline TTS for tests and benchmarks: emits silent MPEG-1 Layer III frames
+    lasting roughly as long as the line would take to read aloud.
     """
-    output_dir = os.path.join("static", "output")
+
+    lang = 'en'
+    provider = None
+    # 32 kbps, 44.1 kHz, mono, no padding: 104-byte frames of 1152 samples
+    FRAME = bytes([0xFF, 0xFB, 0x10, 0xC0]) + bytes(100)
+    FRAME_SECONDS = 1152 / 44100
+
+    def __init__(self, words_per_second=2.5):
+        self.words_per_second = words_per_second
+
+    def synthesize(self, text):
+        seconds = max(0.5, len(text.split()) / self.words_per_second)
+        return self.FRAME * int(round(seconds / self.FRAME_SECONDS))
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_tts_backend():
+    """Process-wide TTS backend, chosen with REEL_TTS_BACKEND=gtts|stub."""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            name = os.environ.get("REEL_TTS_BACKEND", "gtts").lower()
+            _backend = StubTTSBackend() if name == "stub" else GTTSBackend()
+        return _backend
+
+
+def synthesize_line(text, backend=None):
+    """
+    Synthesizes one script line to MP3 audio frames.
+    Cached per line, so editing one line only re-synthesizes that line, and
+    concurrent requests for the same line share one call.
+    """
+    backend = backend or get_tts_backend()
+    key = DiskCache.make_key("tts_line", text, lang=backend.lang, backend=type(backend).__name__)
+    with span("tts_line", chars=len(text)):
+        return coalesce("tts", key, _synthesize, backend, key, text)
+
+
+def _synthesize(backend, key, text):
+    cache = get_cache()
+    cached = cache.get(key) if cache else None
+    if cached is not None:
+        return cached
+
+    with api_slot(backend.provider):
+        audio = mp3_audio_frames(backend.synthesize(text))
+    if cache and audio:
+        cache.put(key, audio)
+    return audio
+
+
+def generate_voiceover_with_timings(script_lines, output_dir=None, max_workers=None):
+    """
+    Synthesizes every script line concurrently and joins them into one MP3.
+    Saves <output_dir>/voice.mp3 and voice_timings.json (static/output by default).
+    Returns (path to the audio file, timings) where timings is a list of
+    {"index", "text", "start", "end", "audio_hash"} dicts (times in seconds);
+    (None, None) on failure.
+    """
+    if output_dir is None:
+        output_dir = os.path.join("static", "output")
     os.makedirs(output_dir, exist_ok=True)
     filepath = os.path.join(output_dir, "voice.mp3")
+    if max_workers is None:
+        max_workers = int(os.environ.get("REEL_TTS_WORKERS", 4))
 
-    full_text = " ".join(script_lines)
-    print("Generating voiceover...")
+    logger.info(f"Generating voiceover for {len(script_lines)} lines...")
 
     try:
-        tts = gTTS(text=full_text, lang='en')
-        tts.save(filepath)
-        return filepath
+        backend = get_tts_backend()
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(script_lines)))) as executor:
+            futures = [executor.submit(in_context(synthesize_line), line, backend) for line in script_lines]
+            segments = [future.result() for future in futures]
+
+        timings = []
+        position = 0.0
+        for i, (line, audio) in enumerate(zip(script_lines, segments)):
+            duration = mp3_duration(audio)
+            timings.append({"index": i, "text": line, "start": position, "end": position + duration,
+                            "audio_hash": hashlib.sha256(audio).hexdigest()})
+            position += duration
+
+        with open(filepath, "wb") as f:
+            for audio in segments:
+                f.write(audio)
+        with open(os.path.join(output_dir, "voice_timings.json"), "w") as f:
+            json.dump(timings, f, indent=2)
+
+        return filepath, timings
     except Exception as e:
-        print(f"Error generating voiceover: {e}")
-        return None
+        logger.error(f"Error generating voiceover: {e}")
+        return None, None
+
+
+def generate_voiceover(script_lines, output_dir=None):
+    """
+    Generates the voiceover MP3 for the script (one TTS request per line).
+    Saves to <output_dir>/voice.mp3 (static/output by default).
+    Returns path to the audio file.
+    """
+    filepath, _ = generate_voiceover_with_timings(script_lines, output_dir)
+    return filepath
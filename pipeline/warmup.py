@@ -0,0 +1,79 @@
+import logging
+import os
+import threading
+import time
+
+from pipeline.metrics import record_span
+
+logger = logging.getLogger(__name__)
+
+_warmed = threading.Event()
+
+
+def prewarm_enabled():
+    return os.environ.get("REEL_PREWARM", "0").lower() in ("1", "true", "yes", "on")
+
+
+def warm_worker():
+    """
+    Initializer of the render worker processes: loads NumPy, Pillow, MoviePy,
+    the ffmpeg binary path and the caption font once, before the first segment.
+    """
+    import moviepy  # noqa: F401
+    from moviepy.config import FFMPEG_BINARY  # noqa: F401
+    from pipeline import frame_renderer  # noqa: F401
+    from pipeline.text_layout import load_font
+
+    load_font(50)
+
+
+def _worker_pid():
+    return os.getpid()
+
+
+def prewarm():
+    """
+    Warms this process and the render pool: loads the rendering stack, creates
+    the LLM, TTS, HTTP and cache clients, and starts every render worker.
+    Returns the seconds it took.
+    """
+    from pipeline.cache import get_cache
+    from pipeline.http_client import get_http_client
+    from pipeline.script_writer import get_backend
+    from pipeline.video_maker import get_segment_pool, render_workers
+    from pipeline.voiceover import get_tts_backend
+
+    start = time.perf_counter()
+    try:
+        warm_worker()
+        get_backend()
+        get_tts_backend()
+        get_http_client()
+        get_cache()
+        # The pool starts workers on demand; one task per slot brings them all up
+        pool = get_segment_pool()
+        pids = {future.result() for future in [pool.submit(_worker_pid) for _ in range(render_workers())]}
+        seconds = time.perf_counter() - start
+        record_span("prewarm", seconds, workers=len(pids))
+        logger.info(f"Prewarmed in {seconds:.1f}s ({len(pids)} render worker(s))")
+        return seconds
+    finally:
+        _warmed.set()
+
+
+def start_prewarm():
+    """Runs prewarm() on a background thread, so the server answers while it warms up."""
+    def run():
+        try:
+            prewarm()
+        except Exception as e:
+            logger.warning(f"Prewarm failed: {e}")
+
+    thread = threading.Thread(target=run, name="reel-prewarm", daemon=True)
+    thread.start()
+    return thread
+
+
+def wait_prewarmed(timeout=None):
+    """Blocks until a started prewarm has finished (or failed). Returns False on timeout."""
+    return _warmed.wait(timeout)
@@ -0,0 +1,69 @@
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(autouse=True)
+def offline(monkeypatch, tmp_path):
+    """Stub LLM and TTS backends, no disk cache, and fresh process-wide clients for every test."""
+    import pipeline.http_client as http_client
+    import pipeline.limits as limits
+    import pipeline.script_writer as script_writer
+    import pipeline.voiceover as voiceover
+
+    monkeypatch.setenv("REEL_LLM_BACKEND", "stub")
+    monkeypatch.setenv("REEL_TTS_BACKEND", "stub")
+    monkeypatch.setenv("REEL_CACHE", "0")
+    monkeypatch.chdir(tmp_path)
+    for module, name in ((script_writer, "_backend"), (voiceover, "_backend"), (http_client, "_client")):
+        monkeypatch.setattr(module, name, None)
+    monkeypatch.setattr(limits, "_limiters", {})
+
+
+def fake_run_reel(prompt, output_dir, script=None, **kwargs):
+    """Stands in for run_reel: writes a placeholder video and echoes the script (three lines by default)."""
+    os.makedirs(output_dir, exist_ok=True)
+    with open(os.path.join(output_dir, "final_video.mp4"), "wb") as f:
+        f.write(b"video")
+    lines, background = script or (["one", "two", "three"], "background")
+    return {"script_lines": lines, "background_prompt": background, "video_path": None, "ui_bg_path": None}
+
+
+@pytest.fixture
+def make_queue(monkeypatch, tmp_path):
+    """Builds JobQueues running fake_run_reel under tmp_path, without the artifact store."""
+    from pipeline.jobs import JobQueue
+
+    monkeypatch.setenv("REEL_ARTIFACTS", "0")
+    queues = []
+
+    def make(**kwargs):
+        kwargs = {"max_workers": 1, "output_root": str(tmp_path), "runner": fake_run_reel, **kwargs}
+        queues.append(JobQueue(**kwargs))
+        return queues[-1]
+
+    yield make
+    for queue in queues:
+        queue.shutdown()
+
+
+@pytest.fixture
+def wait_done():
+    """Waits for a job of a JobQueue to finish; returns it."""
+    from pipeline.jobs import DONE, FAILED
+
+    def wait(jobs, job_id, timeout=5):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            job = jobs.get(job_id)
+            if job.status in (DONE, FAILED):
+                assert job.status == DONE, job.error
+                return job
+            time.sleep(0.01)
+        raise AssertionError("job did not finish")
+
+    return wait
@@ -0,0 +1,36 @@
+import pytest
+
+
+@pytest.fixture
+def client(monkeypatch, make_queue):
+    import app as webapp
+
+    monkeypatch.setattr(webapp, "jobs", make_queue())
+    return webapp.app.test_client(), webapp.jobs
+
+
+@pytest.mark.parametrize("payload", [
+    {"script_lines": "hello"},
+    {"script_lines": {"a": 1, "b": 2}},
+    {"script_lines": ["line"] * 7},
+    {"script_lines": ["ok", ""]},
+    {"index": 0, "text": 5},
+    {"index": True, "text": "new"},
+    {"index": 3, "text": "new"},
+    {},
+])
+def test_edit_rejects_bad_scripts(client, wait_done, payload):
+    http, jobs = client
+    job = wait_done(jobs, jobs.submit("topic").id)
+    response = http.post(f"/jobs/{job.id}/edit", json=payload)
+    assert response.status_code == 400
+
+
+def test_edit_queues_the_edited_script(client, wait_done):
+    http, jobs = client
+    job = wait_done(jobs, jobs.submit("topic").id)
+    response = http.post(f"/jobs/{job.id}/edit", json={"index": 1, "text": " changed "})
+    assert response.status_code == 202
+    edit = wait_done(jobs, response.get_json()["id"])
+    assert edit.result["script_lines"] == ["one", "changed", "three"]
+    assert edit.parent_id == job.id
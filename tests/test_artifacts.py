@@ -0,0 +1,31 @@
+import os
+
+from pipeline.artifacts import ArtifactStore
+
+
+def test_pinned_names_survive_gc_until_unpinned(tmp_path):
+    store = ArtifactStore(root=str(tmp_path / "store"), max_bytes=0)
+    src = tmp_path / "reel.mp4"
+    src.write_bytes(b"video")
+
+    name = store.put(str(src), pin=True)
+    # A second publish of the same bytes is a dedup hit and pins the name again
+    assert store.put(str(src), pin=True) == name
+    store.gc()
+    store.unpin(name)
+    store.gc()
+    assert os.path.exists(store.path(name))
+
+    store.unpin(name)
+    store.gc()
+    assert not os.path.exists(store.path(name))
+
+
+def test_unpinned_put_leaves_nothing_pinned(tmp_path):
+    store = ArtifactStore(root=str(tmp_path / "store"), max_bytes=0)
+    src = tmp_path / "bg.jpg"
+    src.write_bytes(b"image")
+    name = store.put(str(src))
+    store.gc()
+    assert not os.path.exists(store.path(name))
+    assert store.stats()["removed"] == 1
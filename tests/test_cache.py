@@ -0,0 +1,26 @@
+from pipeline.cache import DiskCache
+
+
+def test_eviction_frees_down_to_the_low_water_mark(tmp_path, monkeypatch):
+    cache = DiskCache(root=str(tmp_path), max_bytes=10_000, ttl=0, low_water=0.5)
+    scans = []
+    evict = cache.evict
+    monkeypatch.setattr(cache, "evict", lambda: scans.append(1) or evict())
+
+    for n in range(11):
+        cache.put(DiskCache.make_key("image", f"prompt {n}"), bytes(1000))
+    assert len(scans) == 1
+    assert cache.stats()["bytes_stored"] <= 5_000
+    # The newest entries survive, and the next writes fit without another scan
+    assert cache.get(DiskCache.make_key("image", "prompt 10")) is not None
+    for n in range(11, 15):
+        cache.put(DiskCache.make_key("image", f"prompt {n}"), bytes(1000))
+    assert len(scans) == 1
+
+
+def test_json_round_trip(tmp_path):
+    cache = DiskCache(root=str(tmp_path))
+    key = DiskCache.make_key("script_bundle", "topic", model="m")
+    cache.put_json(key, [["a", "b"], "background"])
+    assert cache.get_json(key) == [["a", "b"], "background"]
+    assert cache.get_json(DiskCache.make_key("script_bundle", "other")) is None
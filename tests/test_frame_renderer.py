@@ -0,0 +1,15 @@
+from pipeline.frame_renderer import frame_range
+
+
+def test_scene_frames_add_up_to_the_reel_clock():
+    fps = 12
+    durations = [1.04, 2.29, 0.96, 1.71, 2.04, 1.46]
+    start, frames = 0.0, 0
+    for duration in durations:
+        first, last = frame_range(start, duration, fps)
+        assert first == frames  # each scene picks up where the last one ended
+        frames = last
+        start += duration
+        # Every scene boundary is within half a frame of the voice
+        assert abs(frames / fps - start) <= 0.5 / fps
+    assert frames == round(sum(durations) * fps)
@@ -0,0 +1,67 @@
+import threading
+import time
+
+import pytest
+
+from pipeline import limits
+from pipeline.fake_servers import FakePollinations
+from pipeline.http_client import HttpClient, HttpError
+from pipeline.limits import AdaptiveLimiter
+
+
+def test_retries_transient_errors():
+    with FakePollinations(error_rate=0.5, seed=1) as server:
+        client = HttpClient(retries=8, backoff=0.01)
+        for i in range(5):
+            img, data = client.get_image(f"{server.base_url}/prompt/cat?width=32&height=32&seed={i}")
+            assert img.size == (32, 32)
+        client.close()
+    assert client.stats["retries"] == server.counts["errors"] > 0
+    assert client.stats["failures"] == 0
+
+
+def test_gives_up_after_the_last_retry():
+    with FakePollinations(error_rate=1.0) as server:
+        client = HttpClient(retries=2, backoff=0.01)
+        with pytest.raises(HttpError) as e:
+            client.get_bytes(f"{server.base_url}/prompt/cat")
+        client.close()
+    assert e.value.status == 503
+    assert server.counts["requests"] == 3
+    assert client.stats["failures"] == 1
+
+
+def test_hedge_beats_a_slow_request():
+    with FakePollinations() as server:
+        # Only the first request lands in the slow tail; the hedge answers straight away
+        plans = iter([(1.0, 200)])
+        server._plan = lambda: next(plans, (0, 200))
+        client = HttpClient(retries=0, hedge_after=0.1)
+        start = time.monotonic()
+        data = client.get_bytes(f"{server.base_url}/prompt/cat?width=16&height=16")
+        elapsed = time.monotonic() - start
+        client.close()
+    assert data[:8] == b"\x89PNG\r\n\x1a\n"
+    assert client.stats["hedges"] == 1
+    assert server.counts["requests"] == 2
+    assert elapsed < 0.8
+
+
+def test_primary_failing_after_the_hedge_does_not_deadlock():
+    limits._limiters["pollinations"] = AdaptiveLimiter("pollinations", initial=1, min_limit=1, max_limit=1)
+    with FakePollinations() as server:
+        # The first request fails slowly, after the hedge has gone out
+        plans = iter([(0.5, 503)])
+        server._plan = lambda: next(plans, (0, 200))
+        client = HttpClient(retries=0, hedge_after=0.1, provider="pollinations")
+        result = []
+        thread = threading.Thread(target=lambda: result.append(
+            client.get_bytes(f"{server.base_url}/prompt/cat?width=16&height=16")), daemon=True)
+        thread.start()
+        thread.join(timeout=5)
+        client.close()
+    assert result, "get_bytes is stuck waiting for a second limiter slot"
+    data = result[0]
+    assert data[:8] == b"\x89PNG\r\n\x1a\n"
+    assert client.stats["hedges"] == 1
+    assert limits._limiters["pollinations"].snapshot()["in_flight"] == 0
@@ -0,0 +1,15 @@
+import time
+
+from pipeline.fake_servers import FakePollinations
+from pipeline.image_generator import IMAGE_SIZE, fetch_backgrounds
+
+
+def test_background_variants_download_concurrently(monkeypatch):
+    with FakePollinations(latency=0.3) as server:
+        monkeypatch.setenv("POLLINATIONS_BASE_URL", server.base_url)
+        start = time.monotonic()
+        backgrounds = fetch_backgrounds("misty forest", variants=3)
+        elapsed = time.monotonic() - start
+    assert [bg.shape for bg in backgrounds] == [(IMAGE_SIZE[1], IMAGE_SIZE[0], 3)] * 3
+    assert server.counts["max_in_flight"] == 3
+    assert elapsed < 0.8
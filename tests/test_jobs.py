@@ -0,0 +1,62 @@
+import os
+import time
+
+from pipeline import cache, scene_manifest
+from pipeline.fake_servers import FakePollinations
+from pipeline.jobs import run_reel
+
+
+def test_forgotten_job_directories_are_removed_without_the_store(make_queue, wait_done):
+    jobs = make_queue(max_history=2)
+    done = [wait_done(jobs, jobs.submit(f"topic {n}").id) for n in range(3)]
+    wait_done(jobs, jobs.submit("one more").id)
+    jobs.shutdown()
+
+    assert jobs.get(done[0].id) is None
+    assert not os.path.exists(done[0].output_dir)
+    assert os.path.exists(done[-1].output_dir)
+
+
+def test_sweep_removes_only_old_unknown_job_directories(make_queue, tmp_path):
+    old_job, new_job, other = tmp_path / ("a" * 32), tmp_path / ("b" * 32), tmp_path / "artifacts"
+    for path in (old_job, new_job, other):
+        path.mkdir()
+    day_ago = time.time() - 2 * 24 * 3600
+    os.utime(old_job, (day_ago, day_ago))
+    os.utime(other, (day_ago, day_ago))
+
+    # Sweeps at start-up
+    make_queue()
+
+    assert not old_job.exists()
+    assert new_job.exists() and other.exists()
+
+
+def test_edit_reuses_unchanged_scenes(monkeypatch, tmp_path):
+    for name, value in {"REEL_FINAL_PROFILE": "preview", "REEL_PREVIEW_PROFILE": "none", "REEL_STREAM": "0",
+                        "REEL_RENDER_MODE": "segments", "REEL_CACHE": "1",
+                        "REEL_CACHE_DIR": str(tmp_path / "cache")}.items():
+        monkeypatch.setenv(name, value)
+    monkeypatch.setattr(cache, "_cache", None)
+    first_dir, edit_dir = str(tmp_path / "first"), str(tmp_path / "edit")
+
+    with FakePollinations() as server:
+        monkeypatch.setenv("POLLINATIONS_BASE_URL", server.base_url)
+        first = run_reel("tide pools", first_dir)
+        downloads = server.counts["requests"]
+        lines = list(first["script_lines"])
+        # As many words as the old line, so the stub voice keeps every later scene where it was
+        lines[1] = "A brand new line about the tide pools here."
+        assert len(lines[1].split()) == len(first["script_lines"][1].split())
+        edit = run_reel("tide pools", edit_dir, script=(lines, first["background_prompt"]), previous_dir=first_dir)
+
+    assert first["reused_scenes"] == []
+    assert edit["reused_scenes"] == [0, 2, 3, 4]
+    # Only the changed scene's foreground; the shared background comes from the cache
+    assert server.counts["requests"] - downloads == 1
+    assert os.path.exists(edit["video_path"])
+    manifest = scene_manifest.load_manifest(edit_dir)
+    assert [scene["text"] for scene in manifest["scenes"]] == lines
+    for i in (0, 2, 3, 4):
+        assert os.path.samefile(os.path.join(first_dir, "segments", f"segment_{i}.mp4"),
+                                os.path.join(edit_dir, "segments", f"segment_{i}.mp4"))
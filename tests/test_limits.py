@@ -0,0 +1,98 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from pipeline import limits
+from pipeline.fake_servers import FakePollinations
+from pipeline.http_client import HttpClient, HttpError
+from pipeline.limits import AdaptiveLimiter, is_overload
+from pipeline.metrics import set_job
+
+
+def test_waiting_jobs_are_served_round_robin():
+    limiter = AdaptiveLimiter("test", initial=1, max_limit=1)
+    held = limiter.acquire("batch")
+    order = []
+
+    def call(job):
+        limiter.release(limiter.acquire(job))
+        order.append(job)
+
+    threads = []
+    for job in ["batch"] * 4 + ["interactive"] * 2:
+        threads.append(threading.Thread(target=call, args=(job,)))
+        threads[-1].start()
+        time.sleep(0.02)  # queue them in this order
+    limiter.release(held)
+    for thread in threads:
+        thread.join()
+
+    assert order[:4] == ["batch", "interactive", "batch", "interactive"]
+
+
+def test_window_halves_once_per_window_and_grows_on_success():
+    limiter = AdaptiveLimiter("test", initial=8, max_limit=8)
+    handles = [limiter.acquire() for _ in range(4)]
+    for handle in handles:
+        # Calls that were in flight together shrink the window only once
+        limiter.release(handle, overloaded=True)
+    assert limiter.limit == 4
+    assert limiter.snapshot()["throttled"] == 4
+
+    for _ in range(4):
+        limiter.release(limiter.acquire())
+    assert 4 < limiter.limit <= 5
+
+
+def test_is_overload():
+    assert is_overload(HttpError("HTTP 429", status=429))
+    assert is_overload(HttpError("HTTP 503", status=503))
+    assert not is_overload(HttpError("HTTP 404", status=404))
+    assert not is_overload(ValueError("bad json"))
+
+
+@pytest.mark.parametrize("hedge_after", [None, 0.03])
+def test_small_job_is_not_queued_behind_a_batch(hedge_after):
+    limits._limiters["pollinations"] = AdaptiveLimiter("pollinations", initial=2, min_limit=2, max_limit=2)
+    client = HttpClient(max_concurrency=16, backoff=0.01, hedge_after=hedge_after, provider="pollinations")
+    done = {"batch": [], "interactive": []}
+
+    def fetch(job, n):
+        set_job(job)
+        client.get_bytes(f"{server.base_url}/prompt/{job}%20{n}?width=64&height=64&seed={n}")
+        done[job].append(time.perf_counter())
+
+    with FakePollinations(latency=0.05) as server:
+        with ThreadPoolExecutor(max_workers=16) as batch, ThreadPoolExecutor(max_workers=2) as interactive:
+            for n in range(24):
+                batch.submit(fetch, "batch", n)
+            time.sleep(0.1)
+            for n in range(2):
+                interactive.submit(fetch, "interactive", n)
+    client.close()
+    if hedge_after:
+        assert client.stats["hedges"] > 0
+
+    # 24 calls through a window of 2 take ~0.6s; round robin gets the two small ones in early
+    assert len(done["batch"]) == 24 and len(done["interactive"]) == 2
+    remaining = sum(1 for t in done["batch"] if t > max(done["interactive"]))
+    assert remaining >= 12
+
+
+def test_async_calls_hold_the_batch_wide_slots():
+    slots = threading.Semaphore(1)
+    limits.set_api_slots(slots)
+    seen = []
+
+    async def call():
+        async with limits.api_slot_async("gemini"):
+            seen.append(slots._value)
+
+    try:
+        asyncio.run(call())
+    finally:
+        limits.set_api_slots(None)
+    assert seen == [0] and slots._value == 1
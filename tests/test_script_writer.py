@@ -0,0 +1,29 @@
+import asyncio
+import json
+
+from pipeline import script_writer
+from pipeline.script_writer import (MAX_SCRIPT_LINES, StubBackend, build_prompt, get_backend, parse_bundle,
+                                    write_script_bundle, write_script_bundle_async)
+
+
+def test_stub_response_round_trips_through_parse_bundle():
+    topic = "deep sea vents"
+    lines, background = parse_bundle(StubBackend(lines=5).complete(build_prompt(topic)), topic)
+    assert len(lines) == 5
+    assert all(topic in line for line in lines)
+    assert topic in background
+
+
+def test_parse_bundle_tolerates_fences_and_caps_lines():
+    text = "```json\n" + json.dumps({"script": [f" line {i} " for i in range(10)] + [""], "background": ""}) + "\n```"
+    lines, background = parse_bundle(text, "owls")
+    assert lines == [f"line {i}" for i in range(MAX_SCRIPT_LINES)]
+    assert background == script_writer.get_default_background("owls")
+
+
+def test_one_backend_call_per_topic():
+    backend = get_backend()
+    assert get_backend() is backend
+    sync = write_script_bundle("  tidal   pools ")
+    assert asyncio.run(write_script_bundle_async("tidal pools")) == sync
+    assert backend.calls == 2  # no disk cache in tests; each bundle is a single call
@@ -0,0 +1,22 @@
+import numpy as np
+
+from pipeline.text_layout import caption_sprite, draw_caption, render_caption
+
+
+def test_sprite_is_the_cropped_caption():
+    args = ("A caption long enough to wrap onto a second line of text", (360, 640), 20, "white", 1, "black", 30)
+    frame = draw_caption(*args)
+    x, y, sprite = caption_sprite(*args)
+    h, w = sprite.shape[:2]
+    assert h < frame.shape[0] and w <= frame.shape[1]
+    assert not sprite.flags.writeable
+    # Nothing visible outside the box
+    assert frame[..., 3].sum() == sprite[..., 3].sum()
+    assert np.array_equal(frame[y:y + h, x:x + w], sprite)
+    assert np.array_equal(render_caption(*args), frame)
+
+
+def test_empty_caption_has_an_empty_sprite():
+    x, y, sprite = caption_sprite(" ", (64, 64), 10, "white", 0, "black", 5)
+    assert sprite.size == 0
+    assert not render_caption(" ", (64, 64), 10, "white", 0, "black", 5).any()
@@ -0,0 +1,34 @@
+import json
+import os
+
+from pipeline.voiceover import (StubTTSBackend, generate_voiceover_with_timings, iter_mp3_frames,
+                                mp3_audio_frames, mp3_duration)
+
+
+def test_stub_frames_are_parsed_and_timed():
+    audio = StubTTSBackend().synthesize("one two three four five")  # two seconds at 2.5 words/s
+    frames = list(iter_mp3_frames(audio))
+    assert all(length == len(StubTTSBackend.FRAME) for _, length, _ in frames)
+    assert abs(mp3_duration(audio) - 2.0) < StubTTSBackend.FRAME_SECONDS
+
+
+def test_id3_tag_and_xing_header_are_skipped():
+    audio = StubTTSBackend().synthesize("a few words")
+    xing = bytearray(StubTTSBackend.FRAME)
+    xing[4 + 17:8 + 17] = b"Xing"  # MPEG-1 mono side info is 17 bytes
+    tagged = b"ID3\x04\x00\x00\x00\x00\x00\x05" + bytes(5) + bytes(xing) + audio
+    assert mp3_audio_frames(tagged) == audio
+    assert mp3_duration(tagged) == mp3_duration(audio)
+
+
+def test_timings_are_contiguous_and_match_the_joined_file(tmp_path):
+    lines = ["First line of the reel.", "A second, somewhat longer line of the script.", "Last."]
+    path, timings = generate_voiceover_with_timings(lines, output_dir=str(tmp_path))
+    assert [t["text"] for t in timings] == lines
+    assert timings[0]["start"] == 0.0
+    for previous, current in zip(timings, timings[1:]):
+        assert current["start"] == previous["end"]
+    with open(path, "rb") as f:
+        assert abs(mp3_duration(f.read()) - timings[-1]["end"]) < 1e-9
+    with open(os.path.join(tmp_path, "voice_timings.json")) as f:
+        assert json.load(f) == timings